@@ -0,0 +1,36 @@
+"""
+Benchmark of the index collision check
+
+Times `find_index_collisions` on random 10+10 base barcodes for pools up
+to and beyond a 1,536-sample run.
+
+Usage:
+
+    python benchmarks/bench_collisions.py
+"""
+import random
+import timeit
+
+import synthetic  # noqa: F401 (puts the checker on sys.path)
+
+from barcodes import find_index_collisions
+
+SIZES = [96, 384, 1_536, 3_072]
+
+
+def random_sequences(n: int, length: int = 10):
+    return ["".join(random.choices("ACGT", k=length)) for i in range(n)]
+
+
+def main():
+    random.seed(0)
+    print(f"{'samples':>8} {'time (ms)':>10} {'collisions':>11}")
+    for n_samples in SIZES:
+        index, index2 = random_sequences(n_samples), random_sequences(n_samples)
+        collisions = find_index_collisions(index, index2)
+        elapsed = min(timeit.repeat(lambda: find_index_collisions(index, index2), number=1, repeat=5))
+        print(f"{n_samples:>8} {elapsed * 1e3:>10.2f} {len(collisions):>11}")
+
+
+if __name__ == "__main__":
+    main()
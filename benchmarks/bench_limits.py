@@ -0,0 +1,174 @@
+"""
+Stress benchmark of the streaming parse on pathological samplesheets
+
+Builds malformed sheets of growing size, each a valid synthetic sheet
+followed by one pathology, and parses them with the stream engine under
+the default `ParseLimits`, recording time, peak memory and the limit
+that stopped the parse:
+
+- `trailing_commas`: rows of delimiters only, as left by an Excel export
+- `long_line`: one line of several megabytes
+- `many_rows`: an oversized TSO500S_Data section
+- `many_sections`: a flood of section headers
+
+For comparison, the default csv engine parses the same files up to
+`--baseline-max` MiB; its memory grows with the file. Below its limits
+the stream engine's memory grows too (e.g. an oversized section under
+`max_rows`), but once a limit stops the parse it must not: the run fails
+(exit status 1) when the stream engine's peak memory on the largest file
+of a pathology is more than twice that on the next largest.
+
+Times are taken with `tracemalloc` running, which slows the stream
+engine's per-line work most (several times over for the trailing comma
+rows); compare them with each other, not with an uninstrumented parse.
+
+Usage:
+
+    python benchmarks/bench_limits.py
+    python benchmarks/bench_limits.py --sizes 1 16 256 --baseline-max 16
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+from synthetic import write_samplesheet
+
+from exceptions import ParseLimitError
+from samplesheetparser import ParseLimits, SampleSheet
+
+# sizes of the pathological sheets, in MiB
+SIZES = [1, 8, 64]
+
+# peak memory on the largest sheet may be at most this many times that on
+# the next largest
+MAX_GROWTH = 2.0
+
+CHUNK = 1024 * 1024
+
+
+def trailing_commas(f, n_bytes: int) -> None:
+    row = b"," * 11 + b"\r\n"
+    block = row * (CHUNK // len(row))
+    for _ in range(n_bytes // len(block)):
+        f.write(block)
+
+
+def long_line(f, n_bytes: int) -> None:
+    f.write(b"[Notes]\r\n")
+    block = b"x" * CHUNK
+    for _ in range(n_bytes // CHUNK):
+        f.write(block)
+    f.write(b"\r\n")
+
+
+def many_rows(f, n_bytes: int) -> None:
+    f.write(b"[Extra_Data]\r\nSample_ID,Index\r\n")
+    row = b"X-20240000-D,ACGTACGTAC\r\n"
+    block = row * (CHUNK // len(row))
+    for _ in range(n_bytes // len(block)):
+        f.write(block)
+
+
+def many_sections(f, n_bytes: int) -> None:
+    written = 0
+    i = 0
+    while written < n_bytes:
+        lines = b"".join(b"[Section%d]\r\nKey,Value\r\n" % (i + j) for j in range(10_000))
+        f.write(lines)
+        written += len(lines)
+        i += 10_000
+
+
+PATHOLOGIES: Dict[str, Callable] = {
+    "trailing_commas": trailing_commas,
+    "long_line": long_line,
+    "many_rows": many_rows,
+    "many_sections": many_sections,
+}
+
+
+def write_pathological(path: str, base: bytes, pathology: str, n_bytes: int) -> str:
+    with open(path, "wb") as f:
+        f.write(base)
+        PATHOLOGIES[pathology](f, n_bytes)
+    return path
+
+
+def measure(path: str, limits: Optional[ParseLimits]) -> Tuple[float, int, str]:
+    """
+    Parses a sheet, returning the seconds taken, the peak memory allocated
+    in bytes, and the limit that stopped the parse (or `-`)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        if limits is None:
+            SampleSheet(path, layout="columns")
+        else:
+            SampleSheet(path, layout="columns", limits=limits)
+        stopped = "-"
+    except ParseLimitError as e:
+        stopped = f"{e.limit} (line {e.line})"
+    except Exception as e:
+        stopped = type(e).__name__
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, stopped
+
+
+def run(sizes: List[int], pathologies: List[str], baseline_max: int) -> bool:
+    """
+    Measures every pathology at every size
+
+    Returns:
+        True when the stream engine's memory stayed bounded throughout
+    """
+    bounded = True
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with open(write_samplesheet(os.path.join(tmpdir, "base.csv"), 96), "rb") as f:
+            base = f.read()
+        print(f"{'pathology':>16} {'MiB':>6} {'engine':>7} {'time (ms)':>10} {'peak (KiB)':>11}  stopped by")
+        for pathology in pathologies:
+            peaks = []
+            for size in sizes:
+                path = write_pathological(os.path.join(tmpdir, f"{pathology}.csv"), base, pathology,
+                                          size * CHUNK)
+                engines = [("stream", ParseLimits())]
+                if size <= baseline_max:
+                    engines.append(("csv", None))
+                for engine, limits in engines:
+                    elapsed, peak, stopped = measure(path, limits)
+                    if engine == "stream":
+                        peaks.append(peak)
+                    print(f"{pathology:>16} {size:>6} {engine:>7} {elapsed * 1e3:>10.1f} {peak / 1024:>11.1f}"
+                          f"  {stopped}")
+                os.remove(path)
+            growth = peaks[-1] / peaks[-2]
+            print(f"{pathology:>16} stream peak memory grew {growth:.2f}x from {sizes[-2]} to {sizes[-1]} MiB")
+            bounded = bounded and growth <= MAX_GROWTH
+    return bounded
+
+
+def main():
+    argsparser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    argsparser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                            help="sizes of the pathological part of each sheet, in MiB")
+    argsparser.add_argument("--pathologies", nargs="+", choices=list(PATHOLOGIES), default=list(PATHOLOGIES))
+    argsparser.add_argument("--baseline-max", type=int, default=8,
+                            help="largest size, in MiB, also parsed with the default csv engine")
+    args = argsparser.parse_args()
+    if len(args.sizes) < 2:
+        argsparser.error("give at least two --sizes")
+
+    if not run(args.sizes, args.pathologies, args.baseline_max):
+        print(f"stream engine memory is not bounded: peak grew more than {MAX_GROWTH}x")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Benchmark of the `IlluminaFile` parsing engines
+
+Compares the single-pass `csv` tokenizer with the original line-by-line
+`python` engine on synthetic samplesheets of increasing size.
+
+Usage:
+
+    python benchmarks/bench_parser.py
+"""
+import os
+import tempfile
+import timeit
+
+from synthetic import write_samplesheet
+
+from samplesheetparser import IlluminaFile
+
+SIZES = [100, 1_000, 10_000, 50_000]
+SECTIONS = ["TSO500S_Data", "BCLConvert_Data"]
+
+
+def parse(path: str, engine: str):
+    return IlluminaFile(path, delim=",", tabular_sections=SECTIONS, engine=engine).json
+
+
+def main():
+    print(f"{'rows':>8} {'python (ms)':>12} {'csv (ms)':>10} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n_rows in SIZES:
+            path = write_samplesheet(os.path.join(tmpdir, f"{n_rows}.csv"), n_rows)
+            assert parse(path, "python") == parse(path, "csv")
+
+            number = max(1, 20_000 // n_rows)
+            timings = {
+                engine: min(timeit.repeat(lambda: parse(path, engine), number=number, repeat=5)) / number
+                for engine in ("python", "csv")
+            }
+            print(
+                f"{n_rows:>8} {timings['python'] * 1e3:>12.2f} {timings['csv'] * 1e3:>10.2f}"
+                f" {timings['python'] / timings['csv']:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark of the local validation service
+
+Starts `ValidationService` on a free localhost port and posts synthetic
+samplesheets to it from concurrent keep-alive clients, reporting latency
+percentiles and throughput as seen by the clients, next to the service's
+own `/metrics`. Everything runs on localhost.
+
+Each request's sheet gets a different number of trailing blank lines, so
+its bytes are new to the workers' result cache; with `--cached` every
+request posts the same sheet, timing cache hits instead.
+
+Usage:
+
+    python benchmarks/bench_service.py --rows 384 --clients 8 --requests 200 --jobs 4
+    python benchmarks/bench_service.py --cached
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import time
+from typing import Iterator, List, Tuple
+
+from synthetic import UDP_FILE, write_samplesheet
+
+from service import ServiceMetrics, ValidationService
+
+
+async def post(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, content: bytes,
+               name: str) -> Tuple[int, dict]:
+    """
+    Posts one samplesheet on an open connection and returns the status
+    and JSON body of the response
+    """
+    writer.write(f"POST /check?name={name} HTTP/1.1\r\nHost: localhost\r\n"
+                 f"Content-Length: {len(content)}\r\n\r\n".encode() + content)
+    await writer.drain()
+    status_line, *lines = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines if line)
+    body = await reader.readexactly(int(headers["Content-Length"]))
+    return int(status_line.split(" ")[1]), json.loads(body)
+
+
+async def client(address: Tuple[str, int], content: bytes, n_requests: int, latencies: List[float],
+                 counter: Iterator[int]) -> None:
+    reader, writer = await asyncio.open_connection(*address)
+    try:
+        for _ in range(n_requests):
+            i = next(counter)
+            start = time.perf_counter()
+            status, body = await post(reader, writer, content + b"\n" * i, f"bench-{i}.csv")
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                raise RuntimeError(f"service answered {status}: {body}")
+    finally:
+        writer.close()
+
+
+async def get(address: Tuple[str, int], path: str) -> dict:
+    reader, writer = await asyncio.open_connection(*address)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return json.loads(response.split(b"\r\n\r\n", 1)[1])
+
+
+async def run(content: bytes, clients: int, n_requests: int, jobs: int, cached: bool = False) -> None:
+    service = ValidationService(UDP_FILE, jobs=jobs)
+    ready = asyncio.get_running_loop().create_future()
+    server = asyncio.create_task(service.serve("127.0.0.1", 0, ready=ready))
+    address = await ready
+    try:
+        latencies: List[float] = []
+        per_client = max(1, n_requests // clients)
+        counter = itertools.repeat(0) if cached else itertools.count()
+        start = time.perf_counter()
+        await asyncio.gather(*(client(address, content, per_client, latencies, counter) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+        summary = ServiceMetrics.summary(latencies)
+        print(f"{len(latencies)} checks from {clients} clients on {jobs} workers in {elapsed:.2f} s"
+              f" ({len(latencies) / elapsed:.1f} checks/s)")
+        print(f"client latency (ms): mean {summary['mean_ms']:.2f}, p50 {summary['p50_ms']:.2f},"
+              f" p95 {summary['p95_ms']:.2f}, max {summary['max_ms']:.2f}")
+        metrics = await get(address, "/metrics")
+        for name, latency in metrics["latency"].items():
+            print(f"service {name:>5} (ms): mean {latency['mean_ms']:.2f}, p50 {latency['p50_ms']:.2f},"
+                  f" p95 {latency['p95_ms']:.2f}")
+    finally:
+        server.cancel()
+        try:
+            await server
+        except asyncio.CancelledError:
+            pass
+
+
+def main():
+    argsparser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    argsparser.add_argument("--rows", type=int, default=96, help="TSO500S_Data rows per samplesheet")
+    argsparser.add_argument("--clients", type=int, default=8, help="concurrent client connections")
+    argsparser.add_argument("--requests", type=int, default=200, help="total checks to request")
+    argsparser.add_argument("--cached", action="store_true", help="post the same sheet every time")
+    argsparser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="service worker processes")
+    args = argsparser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = write_samplesheet(os.path.join(tmpdir, "SampleSheet.csv"), args.rows)
+        with open(path, "rb") as f:
+            content = f.read()
+    asyncio.run(run(content, args.clients, args.requests, args.jobs, args.cached))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Benchmark suite timing each checker stage separately
+
+Times parsing (`IlluminaFile._read`), DataFrame building, `validate_dict`,
+`validate_table`, D/R pairing, the index order check, the UDP registry
+lookup, the index collision check, the BCLConvert_Data join and both
+end-to-end paths (`main` and `Checker.check`) on valid and broken
+synthetic samplesheets. Results are written as JSON; pass an earlier
+results file with `--compare` to see the change per stage, e.g. between
+releases.
+
+Synthetic sheets beyond 192 rows reuse index pairs, so their collision
+check (and with it both end-to-end paths) grows quadratically; 50,000
+rows takes minutes.
+
+Usage:
+
+    python benchmarks/bench_stages.py -o stages.json
+    python benchmarks/bench_stages.py --sizes 96 50000 --compare stages.json
+"""
+import argparse
+from contextlib import redirect_stdout
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import timeit
+from typing import Callable, Dict, List
+
+from synthetic import load_sschecker, write_samplesheet
+
+from checker import Checker
+from pairing import check_pairs
+from samplesheetparser import SampleSheet
+from schema import data_patterns, header_patterns
+from validation import collision_issues, join_issues, order_issues, registry_issues, validate_table
+
+SIZES = [8, 96, 384, 1_536, 10_000]
+
+# variant name -> `make_samplesheet()` arguments for a sheet of n rows
+VARIANTS: Dict[str, Callable[[int], dict]] = {
+    "valid": lambda n_rows: {},
+    "lanes": lambda n_rows: {"lanes": 4},
+    "bad_indices": lambda n_rows: {"bad_indices": max(1, n_rows // 32)},
+    "broken_pairs": lambda n_rows: {"broken_pairs": max(1, n_rows // 64)},
+    "shuffled": lambda n_rows: {"shuffle": True},
+    "padded": lambda n_rows: {"padded": True},
+}
+
+# seconds spent timing each stage, beyond the calibration run
+BUDGET = 0.5
+
+
+def time_call(function: Callable[[], object]) -> Dict[str, float]:
+    """
+    Returns the best and mean time per call in seconds. Slow calls are
+    only run once; fast ones are repeated within `BUDGET`.
+    """
+    timer = timeit.Timer(function)
+    number, elapsed = timer.autorange()
+    repeat = max(0, min(4, int(BUDGET / elapsed)))
+    times = [elapsed / number] + [t / number for t in timer.repeat(repeat, number)]
+    return {"best": min(times), "mean": sum(times) / len(times), "runs": len(times) * number}
+
+
+def quietly(function: Callable[..., object], *args) -> Callable[[], object]:
+    """
+    Wraps a stage that prints, discarding its output and the exception
+    raised for an invalid sheet
+    """
+    def call():
+        with redirect_stdout(io.StringIO()):
+            try:
+                function(*args)
+            except Exception:
+                pass
+    return call
+
+
+def stages(path: str, checker: Checker, sschecker) -> Dict[str, Callable[[], object]]:
+    """
+    The stages to time for one samplesheet, each as a function of no
+    arguments. Inputs of later stages are prepared up front, so only the
+    stage itself is timed.
+    """
+    samplesheet = SampleSheet(path, lazy=True, layout="columns")
+    data = samplesheet.data
+    bcl_settings = samplesheet.bclconvert_settings
+    bcl_data = samplesheet.bclconvert_data
+    header = samplesheet.header
+
+    timed = {
+        "read": samplesheet._read,
+        "validate_dict": quietly(sschecker.validate_dict, header, header_patterns),
+        "validate_table": lambda: validate_table(data, data_patterns),
+        "pairing": lambda: check_pairs(data["Sample_ID"], data["Pair_ID"], data["Sample_Type"]),
+        "ordering": lambda: order_issues(data, checker.registry),
+        "udp_lookup": lambda: registry_issues(data, checker.registry),
+        "collisions": lambda: collision_issues(data, bcl_settings),
+        "join": lambda: join_issues(data, bcl_data),
+        "checker": lambda: checker.check(path),
+        "main": quietly(sschecker.main, path, checker),
+    }
+    try:
+        import pandas  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        timed["dataframe"] = data.to_dataframe
+    return timed
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def run(sizes: List[int], variants: List[str]) -> dict:
+    """
+    Times every stage on every variant and size
+    """
+    checker = Checker()
+    sschecker = load_sschecker()
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for variant in variants:
+            for n_rows in sizes:
+                path = write_samplesheet(os.path.join(tmpdir, f"{variant}-{n_rows}.csv"), n_rows,
+                                         **VARIANTS[variant](n_rows))
+                for stage, function in stages(path, checker, sschecker).items():
+                    timing = time_call(function)
+                    results.append({"variant": variant, "rows": n_rows, "stage": stage, **timing})
+                    print(f"{variant:>12} {n_rows:>8} {stage:>14} {timing['best'] * 1e3:>12.3f}")
+
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(report: dict, previous: dict) -> None:
+    """
+    Prints the change in best time per stage against an earlier report
+    """
+    before = {(r["variant"], r["rows"], r["stage"]): r["best"] for r in previous["results"]}
+    print(f"\ncompared with {previous.get('commit') or 'previous run'} ({previous.get('date', '?')})")
+    print(f"{'variant':>12} {'rows':>8} {'stage':>14} {'before (ms)':>12} {'after (ms)':>12} {'change':>8}")
+    for r in report["results"]:
+        key = (r["variant"], r["rows"], r["stage"])
+        if key in before:
+            print(f"{key[0]:>12} {key[1]:>8} {key[2]:>14} {before[key] * 1e3:>12.3f}"
+                  f" {r['best'] * 1e3:>12.3f} {r['best'] / before[key]:>7.2f}x")
+
+
+def main():
+    argsparser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    argsparser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                            help="TSO500S_Data row counts (8 to 50,000)")
+    argsparser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=list(VARIANTS),
+                            help="samplesheet variants")
+    argsparser.add_argument("-o", "--output", default="bench_stages.json", help="JSON results file")
+    argsparser.add_argument("--compare", help="earlier JSON results file to compare with")
+    args = argsparser.parse_args()
+
+    print(f"{'variant':>12} {'rows':>8} {'stage':>14} {'best (ms)':>12}")
+    report = run(args.sizes, args.variants)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark of checker start-up time
+
+Measures import-to-first-verdict time: importing the checker and
+validating one samplesheet, each run in a fresh interpreter so module
+imports are cold. The standard-library path (pandas and numpy made
+unimportable) is compared with the checker started alongside pandas, as
+the notebook used to do before running the first check.
+
+Usage:
+
+    python benchmarks/bench_startup.py [n_rows]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from synthetic import SSCHECKER_DIR, UDP_FILE, write_samplesheet
+
+RUNS = 7
+
+SETUPS = {
+    "stdlib only": "sys.modules['pandas'] = None; sys.modules['numpy'] = None",
+    "with pandas": "import pandas",
+}
+
+PROGRAM = """
+import sys, time
+start = time.perf_counter()
+{setup}
+sys.path.insert(0, {sschecker_dir!r})
+from validation import validate
+result = validate({samplesheet!r}, udp={udp!r})
+print(time.perf_counter() - start, result.verdict)
+"""
+
+
+def time_startup(setup: str, samplesheet: str) -> float:
+    """
+    Returns the import-to-verdict time in seconds of one fresh interpreter
+    """
+    program = PROGRAM.format(setup=setup, sschecker_dir=os.path.abspath(SSCHECKER_DIR),
+                             samplesheet=samplesheet, udp=UDP_FILE)
+    output = subprocess.run([sys.executable, "-c", program], check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.split()[0])
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 96
+    with tempfile.TemporaryDirectory() as tmp:
+        samplesheet = os.path.join(tmp, "SampleSheet.csv")
+        write_samplesheet(samplesheet, n_rows)
+        # the first run fills the UDP registry cache
+        time_startup(SETUPS["stdlib only"], samplesheet)
+
+        print(f"{n_rows} rows, median of {RUNS} cold starts")
+        print(f"{'setup':>12} {'time (ms)':>10}")
+        for name, setup in SETUPS.items():
+            times = [time_startup(setup, samplesheet) for i in range(RUNS)]
+            print(f"{name:>12} {statistics.median(times) * 1e3:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark of tabular section validation
+
+Compares the original per-value loop of `validate_dict` with the batched
+`validate_table` on the *[TSO500S_Data]* section of synthetic samplesheets,
+as a DataFrame and as the parser's columnar `Table` respectively.
+
+Usage:
+
+    python benchmarks/bench_validation.py
+"""
+import os
+import re
+import tempfile
+import timeit
+
+import pandas as pd
+
+from synthetic import write_samplesheet
+
+import samplesheetparser as parser
+from schema import data_patterns
+from validation import validate_table
+
+SIZES = [96, 384, 5_000]
+
+
+def validate_loop(data: pd.DataFrame, patterns):
+    """
+    The original `validate_dict` handling of `pd.Series` columns
+    """
+    valid_keys = []
+    invalid_keys = []
+    for field, pattern in patterns.items():
+        if isinstance(pattern, str):
+            for value in data[field]:
+                if value == pattern:
+                    valid_keys.append(value)
+                else:
+                    invalid_keys.append(value)
+        elif isinstance(pattern, re.Pattern):
+            for value in data[field]:
+                if pattern.match(value):
+                    valid_keys.append(value)
+                else:
+                    invalid_keys.append(value)
+    return invalid_keys
+
+
+def main():
+    print(f"{'rows':>8} {'loop (ms)':>10} {'table (ms)':>11} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n_rows in SIZES:
+            path = write_samplesheet(os.path.join(tmpdir, f"{n_rows}.csv"), n_rows)
+            data = parser.parse_samplesheet_data(path)
+            table_data = parser.SampleSheet(path, lazy=True, layout="columns").data
+
+            number = max(1, 20_000 // n_rows)
+            loop = min(timeit.repeat(lambda: validate_loop(data, data_patterns), number=number, repeat=5)) / number
+            table = min(timeit.repeat(lambda: validate_table(table_data, data_patterns), number=number, repeat=5)) / number
+            print(f"{n_rows:>8} {loop * 1e3:>10.2f} {table * 1e3:>11.2f} {loop / table:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
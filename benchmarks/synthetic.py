@@ -0,0 +1,202 @@
+"""
+Synthetic NSWHP TSO500 samplesheet generator for benchmarking
+
+Generates valid samplesheets, or deliberately broken ones with bad indices,
+broken D/R pairs or shuffled row order, optionally spread over lanes or
+padded with trailing delimiters as in an Excel export.
+
+Usage:
+
+    python benchmarks/synthetic.py SampleSheet.csv 384 --lanes 2 --bad-indices 3
+"""
+import argparse
+import csv
+import importlib.util
+import os
+import random
+import sys
+from typing import List, Tuple
+
+SSCHECKER_DIR = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), os.pardir, "content", "sschecker"
+        )
+sys.path.insert(0, os.path.abspath(SSCHECKER_DIR))
+
+UDP_FILE = os.path.join(os.path.abspath(SSCHECKER_DIR), "TSO-novaseq-UDP_v1.5_chemistry.csv")
+SSCHECKER_SCRIPT = os.path.join(os.path.abspath(SSCHECKER_DIR), "sschecker.np.v0.9.1.py")
+
+# base substitution used to corrupt an index sequence
+MUTATE = {"A": "C", "C": "G", "G": "T", "T": "A"}
+
+DATA_COLUMNS = [
+    "Sample_ID", "Sample_Name", "Index_ID", "index", "index2",
+    "I7_Index_ID", "I5_Index_ID", "Description", "Pair_ID", "Sample_Type",
+]
+
+
+def load_sschecker():
+    """
+    Imports the checker script as a module (its filename is not importable)
+    """
+    spec = importlib.util.spec_from_file_location("sschecker", SSCHECKER_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_udp_indices(udp_file: str = UDP_FILE) -> List[Tuple[str, str, str]]:
+    """
+    Reads (Index_ID, index, index2) triples from the UDP registry file
+    """
+    indices = []
+    with open(udp_file, newline="") as f:
+        rows = csv.reader(f)
+        in_data = False
+        for row in rows:
+            if row and row[0] == "[Data]":
+                in_data = True
+                next(rows)
+            elif in_data and any(row):
+                indices.append((row[4], row[5], row[6]))
+    return indices
+
+
+def make_samplesheet(n_rows: int,
+                     lanes: int = 0,
+                     bad_indices: int = 0,
+                     broken_pairs: int = 0,
+                     shuffle: bool = False,
+                     padded: bool = False,
+                     seed: int = 0) -> str:
+    """
+    Builds a TSO500 NSWHP samplesheet with `n_rows` rows in the
+    *[TSO500S_Data]* and *[BCLConvert_Data]* sections. With the default
+    arguments the sheet is valid, as long as `n_rows` does not exceed the
+    192 registered index pairs (beyond that, index pairs repeat and
+    collide).
+
+    Args:
+        n_rows: number of sample rows (D/R pairs are generated two at a time)
+        lanes: number of lanes to spread the D/R pairs over in contiguous
+            blocks; adds a `Lane` column when non-zero
+        bad_indices: number of rows whose i7 sequence is corrupted, so
+            the index pair is no longer registered
+        broken_pairs: number of D/R pairs whose RNA sample gets a
+            different run number, leaving both samples unpaired
+        shuffle: shuffle the row order, breaking the index order
+        padded: pad every line with trailing delimiters to the width of the
+            widest, as an Excel export does; the sheet stays valid
+        seed: seed of the random choices above
+
+    Returns:
+        samplesheet contents as a string
+    """
+    rng = random.Random(seed)
+    indices = load_udp_indices()
+    n_pairs = (n_rows + 1) // 2
+    lane_column = ["Lane"] if lanes else []
+    lines = [
+        "[Header],,",
+        "FileFormatVersion,2,",
+        "Investigator Name,Lab User,",
+        "RunName,240215_01,",
+        "Date,15/2/2024,",
+        "InstrumentType,NovaSeq6000,",
+        "InstrumentPlatform,...,",
+        "Assay,TSO500,",
+        "Index Adapters,TSO500 UDP,",
+        ",,",
+        "[Reads],,",
+        "Read1Cycles,101,",
+        "Read2Cycles,101,",
+        "Index1Cycles,10,",
+        "Index2Cycles,10,",
+        ",,",
+        "[TSO500S_Settings],,",
+        "SoftwareVersion,1.0.0,",
+        "AdapterRead1,CTGTCTCTTATACACATCTCCGAGCCCACGAGAC,",
+        "AdapterRead2,CTGTCTCTTATACACATCTGACGCTGCCGACGA,",
+        "AdapterBehavior,trim,",
+        "MinimumTrimmedReadLength,35,",
+        "MaskShortReads,35,",
+        "OverrideCycles,U7N1Y93;I10;I10;U7N1Y93,",
+        ",,",
+        "[NSWHP],,",
+        "Sequencing Site,JHH,",
+        "Instrument ID,A00532,",
+        ",,",
+        "[TSO500S_Data],,",
+        ",".join(lane_column + DATA_COLUMNS),
+    ]
+
+    bad_rows = set(rng.sample(range(n_rows), min(bad_indices, n_rows)))
+    broken = set(rng.sample(range(n_rows // 2), min(broken_pairs, n_rows // 2)))
+    rows = []
+    for i in range(n_rows):
+        pair, sample_type = divmod(i, 2)
+        suffix, analyte = ("D", "DNA") if sample_type == 0 else ("R", "RNA")
+        run = 99999999 if suffix == "R" and pair in broken else 20240000 + pair % 10000
+        sample_id = f"{pair + 1}-{run:08d}-{suffix}"
+        index_id, index, index2 = indices[i % len(indices)]
+        if i in bad_rows:
+            index = MUTATE[index[0]] + index[1:]
+        lane = [str(pair * lanes // n_pairs + 1)] if lanes else []
+        rows.append((lane, [
+            sample_id, sample_id, index_id, index, index2, index_id, index_id,
+            f"{pair + 1}-{analyte}", str(pair + 1), analyte,
+        ]))
+
+    if shuffle:
+        rng.shuffle(rows)
+    lines += [",".join(lane + row) for lane, row in rows]
+
+    lines += [
+        ",,",
+        "[BCLConvert_Settings],,",
+        "SoftwareVersion,3.6.3,",
+        "AdapterRead1,CTGTCTCTTATACACATCTCCGAGCCCACGAGAC,",
+        "AdapterRead2,CTGTCTCTTATACACATCTGACGCTGCCGACGA,",
+        "AdapterBehavior,trim,",
+        "MinimumTrimmedReadLength,35,",
+        "MaskShortReads,35,",
+        "OverrideCycles,U7N1Y93;I10;I10;U7N1Y93,",
+        ",,",
+        "[BCLConvert_Data],,",
+        ",".join(lane_column + ["Sample_ID", "index", "index2"]),
+    ]
+    lines += [",".join(lane + row[:1] + row[3:5]) for lane, row in rows]
+    if padded:
+        width = max(line.count(",") for line in lines)
+        lines = [line + "," * (width - line.count(",")) for line in lines]
+    return "\n".join(lines) + "\n"
+
+
+def write_samplesheet(path: str, n_rows: int, **variant) -> str:
+    """
+    Writes a synthetic samplesheet to `path` and returns the path. Keyword
+    arguments select a broken variant, as in `make_samplesheet()`
+    """
+    with open(path, "w") as f:
+        f.write(make_samplesheet(n_rows, **variant))
+    return path
+
+
+def main():
+    argsparser = argparse.ArgumentParser(description="Writes a synthetic TSO500 NSWHP samplesheet")
+    argsparser.add_argument("output", help="samplesheet file to write")
+    argsparser.add_argument("rows", type=int, help="number of TSO500S_Data rows (8 to 50,000)")
+    argsparser.add_argument("--lanes", type=int, default=0, help="number of lanes")
+    argsparser.add_argument("--bad-indices", type=int, default=0, help="rows with an unregistered index")
+    argsparser.add_argument("--broken-pairs", type=int, default=0, help="D/R pairs to break")
+    argsparser.add_argument("--shuffle", action="store_true", help="shuffle the row order")
+    argsparser.add_argument("--padded", action="store_true", help="pad lines with trailing delimiters")
+    argsparser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = argsparser.parse_args()
+
+    write_samplesheet(args.output, args.rows, lanes=args.lanes, bad_indices=args.bad_indices,
+                      broken_pairs=args.broken_pairs, shuffle=args.shuffle, padded=args.padded,
+                      seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
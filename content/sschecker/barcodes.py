@@ -0,0 +1,235 @@
+"""
+Index collision checks on 2-bit packed barcodes
+
+numpy is used as an accelerator for large pools when it is installed; it
+is imported lazily, so small sheets are checked with the standard library
+only.
+"""
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+BASE_CODES = {"A": 0, "C": 1, "G": 2, "T": 3}
+BASE_DIGITS = str.maketrans("ACGT", "0123")
+COMPLEMENT = str.maketrans("ACGTN", "TGCAN")
+
+# pools smaller than this are compared pairwise in pure Python, which is
+# quicker than importing numpy for them
+NUMPY_MIN_SAMPLES = 256
+
+# rows of the pairwise distance matrix computed at a time; bounds memory
+# to BLOCK_SIZE * n_samples words for very large pools
+BLOCK_SIZE = 1024
+
+
+class IndexCollision(NamedTuple):
+    """
+    Two samples whose barcodes are too close to be demultiplexed apart.
+    `first` and `second` are row positions in the sheet.
+    """
+    first: int
+    second: int
+    i7_distance: int
+    i5_distance: int
+
+
+def _numpy():
+    """
+    Returns the numpy module, or None when it is not installed
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _check_lengths(sequences: Sequence[str]) -> int:
+    """
+    Returns the common length of the sequences
+
+    Raises:
+        ValueError: sequences differ in length or are longer than 32 bases
+    """
+    lengths = {len(sequence) for sequence in sequences}
+    if len(lengths) > 1:
+        raise ValueError(f"Index sequences differ in length: {sorted(lengths)}")
+    length = lengths.pop() if lengths else 0
+    if length > 32:
+        raise ValueError(f"Index sequences longer than 32 bases: {length}")
+    return length
+
+
+def reverse_complement(sequence: str) -> str:
+    """
+    Returns the reverse complement of a sequence, e.g. an i5 index read
+    in the other orientation
+    """
+    return sequence.translate(COMPLEMENT)[::-1]
+
+
+def pack_sequence(sequence: str) -> int:
+    """
+    Packs an ACGT sequence into an int, 2 bits per base with the first
+    base in the highest bits
+
+    Raises:
+        ValueError: the sequence contains bases other than A, C, G and T
+    """
+    if sequence.strip("ACGT"):
+        raise ValueError("Index sequences may only contain A, C, G and T")
+    return int(sequence.translate(BASE_DIGITS), 4) if sequence else 0
+
+
+def pack_sequences(sequences: Sequence[str]):
+    """
+    Packs equal-length ACGT sequences into a numpy array of one uint64
+    per sequence, 2 bits per base with the first base in the highest bits
+
+    Raises:
+        ValueError: sequences differ in length, are longer than 32 bases
+            or contain bases other than A, C, G and T
+    """
+    import numpy as np
+
+    length = _check_lengths(sequences)
+    raw = np.frombuffer("".join(sequences).encode("ascii"), dtype=np.uint8)
+    lookup = np.full(256, 255, dtype=np.uint8)
+    for base, code in BASE_CODES.items():
+        lookup[ord(base)] = code
+    codes = lookup[raw]
+    if (codes == 255).any():
+        raise ValueError("Index sequences may only contain A, C, G and T")
+
+    if length == 0:
+        return np.zeros(len(sequences), dtype=np.uint64)
+    codes = codes.reshape(len(sequences), length).astype(np.uint64)
+    shifts = np.arange(2 * (length - 1), -1, -2, dtype=np.uint64)
+    return np.bitwise_or.reduce(codes << shifts, axis=1)
+
+
+def _popcount(values):
+    """
+    Number of set bits in each uint64 of a numpy array
+    """
+    import numpy as np
+
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return table[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1)
+
+
+def _mismatch_bits(length: int) -> int:
+    """
+    Mask with the low bit of every 2-bit base set, for `length` bases
+    """
+    return int("01" * length, 2) if length else 0
+
+
+def find_index_collisions(index: Sequence[str],
+                          index2: Sequence[str],
+                          mismatches_index1: int = 1,
+                          mismatches_index2: int = 1,
+                          lanes: Optional[Sequence[str]] = None) -> List[IndexCollision]:
+    """
+    Finds every pair of samples that BCL Convert could not tell apart.
+
+    With `BarcodeMismatchesIndex1 = m1` and `BarcodeMismatchesIndex2 = m2`,
+    a read can be assigned to either of two samples when their i7
+    sequences are at most `2 * m1` apart and their i5 sequences at most
+    `2 * m2` apart (Hamming distance). The i7 and i5 sequences of each
+    sample are packed into one 64-bit word, so all pairwise distances are
+    computed with XOR and popcount; vectorized with numpy for large pools.
+
+    Args:
+        index: i7 sequence of each sample
+        index2: i5 sequence of each sample
+        mismatches_index1: BCL Convert `BarcodeMismatchesIndex1`
+        mismatches_index2: BCL Convert `BarcodeMismatchesIndex2`
+        lanes: lane of each sample; samples in different lanes never collide
+
+    Returns:
+        colliding sample pairs, ordered by row position
+    """
+    if lanes is not None:
+        by_lane: Dict[str, List[int]] = {}
+        for row, lane in enumerate(lanes):
+            by_lane.setdefault(lane, []).append(row)
+        collisions = []
+        for rows in by_lane.values():
+            for collision in find_index_collisions(
+                    [index[row] for row in rows], [index2[row] for row in rows],
+                    mismatches_index1, mismatches_index2):
+                collisions.append(collision._replace(
+                    first=rows[collision.first], second=rows[collision.second]))
+        return sorted(collisions)
+
+    length1 = _check_lengths(index)
+    length2 = _check_lengths(index2)
+    if length1 + length2 > 32:
+        raise ValueError(f"Combined index length longer than 32 bases: {length1 + length2}")
+
+    threshold1 = 2 * mismatches_index1
+    threshold2 = 2 * mismatches_index2
+    if len(index) >= NUMPY_MIN_SAMPLES:
+        if _numpy() is not None:
+            return _find_collisions_numpy(index, index2, length1, length2, threshold1, threshold2)
+
+    i5_shift = 2 * length2
+    barcodes = [
+        (pack_sequence(i7) << i5_shift) | pack_sequence(i5) for i7, i5 in zip(index, index2)
+    ]
+    i5_bits = _mismatch_bits(length2)
+    i7_bits = _mismatch_bits(length1) << i5_shift
+
+    collisions = []
+    for first, barcode in enumerate(barcodes):
+        for second in range(first + 1, len(barcodes)):
+            diff = barcode ^ barcodes[second]
+            # a base mismatches when either of its two bits differs
+            mismatch = diff | (diff >> 1)
+            i7_distance = (mismatch & i7_bits).bit_count()
+            if i7_distance <= threshold1:
+                i5_distance = (mismatch & i5_bits).bit_count()
+                if i5_distance <= threshold2:
+                    collisions.append(IndexCollision(first, second, i7_distance, i5_distance))
+
+    return collisions
+
+
+def _find_collisions_numpy(index: Sequence[str],
+                           index2: Sequence[str],
+                           length1: int,
+                           length2: int,
+                           threshold1: int,
+                           threshold2: int) -> List[IndexCollision]:
+    """
+    Vectorized pairwise comparison for `find_index_collisions()`
+    """
+    import numpy as np
+
+    i5_shift = np.uint64(2 * length2)
+    barcodes = (pack_sequences(index) << i5_shift) | pack_sequences(index2)
+
+    i5_bits = np.uint64(_mismatch_bits(length2))
+    i7_bits = np.uint64(_mismatch_bits(length1)) << i5_shift
+    one = np.uint64(1)
+
+    collisions = []
+    n = len(barcodes)
+    for start in range(0, n, BLOCK_SIZE):
+        block = barcodes[start:start + BLOCK_SIZE, None]
+        others = barcodes[None, start + 1:]
+        diff = block ^ others
+        # a base mismatches when either of its two bits differs
+        mismatch = (diff | (diff >> one))
+        i7_distance = _popcount(mismatch & i7_bits)
+        i5_distance = _popcount(mismatch & i5_bits)
+        close = (i7_distance <= threshold1) & (i5_distance <= threshold2)
+        # only keep pairs above the diagonal, i.e. second > first
+        close &= np.arange(start + 1, n)[None, :] > np.arange(start, start + len(block))[:, None]
+        for row, column in zip(*np.nonzero(close)):
+            collisions.append(IndexCollision(
+                start + int(row), start + 1 + int(column),
+                int(i7_distance[row, column]), int(i5_distance[row, column])))
+
+    return collisions
@@ -0,0 +1,204 @@
+"""
+A reusable samplesheet checker that keeps its setup warm between checks
+"""
+import os
+from typing import Optional, Sequence, Union
+
+from exceptions import ParseLimitError
+from profiling import Profiler
+from resultcache import ResultCache, cache_key, code_digest, source_digest
+from results import Issue, ValidationResult
+from samplesheetparser import ParseLimits, SampleSheet, Source
+from schema import header_patterns, reads_patterns, settings_patterns, site_patterns, bclconvert_settings_patterns
+from schema import data_patterns, bclconvert_data_patterns
+from schemaplan import compile_schema, schema_digest
+from udpregistry import KitRegistry
+from validation import DEFAULT_UDP, SheetContext, run_stages
+
+SCHEMAS = (header_patterns, reads_patterns, settings_patterns, site_patterns, data_patterns,
+           bclconvert_settings_patterns, bclconvert_data_patterns)
+
+
+def source_name(samplesheet: Source) -> str:
+    """
+    Name of a samplesheet that could not be parsed: its path, or
+    `<samplesheet>` when it was given in memory
+    """
+    if isinstance(samplesheet, (str, os.PathLike)) and "\n" not in str(samplesheet):
+        return os.fspath(samplesheet)
+    return "<samplesheet>"
+
+
+class Checker(object):
+    """
+    Checks TSO500 samplesheets against the schema and a UDP registry. The
+    schema is compiled and the registries loaded once, when the checker is
+    created, so every `check()` only parses and validates the sheet.
+
+    Given several registry files (e.g. UDP kit versions), each sheet is
+    checked against the kit that registers most of its index pairs.
+
+    Given `limits`, sheets are parsed with the stream engine, and one
+    exceeding a limit fails with a single `parse_limit` issue naming the
+    offending line instead of being read whole.
+
+    Basic usage:
+
+        >>> checker = Checker()
+        >>> result = checker.check("SampleSheet.csv")
+        >>> result.is_valid
+        >>> result = checker.check(upload.content, name="SampleSheet.csv")
+        >>> Checker(["TSO-novaseq-UDP_v1.5_chemistry.csv", "TSO-UDP_v1.0.csv"]).check("SampleSheet.csv").kit
+        >>> Checker(cache=ResultCache()).check("SampleSheet.csv")
+        >>> Checker(limits=ParseLimits()).check(upload.content, name=upload.name)
+
+    Attributes:
+        udp: UDP registry file, or a list of them
+        mode: sample index selection mode (`default` or `skip`) used when
+            `check()` is not given one
+        kits: the loaded registries, as a `KitRegistry`
+        registry: the registry of the first (or only) kit
+        cache: `ResultCache` of earlier results, or None to check every
+            sheet afresh
+        limits: `ParseLimits` of the stream engine, or None to parse
+            lazily without limits
+    """
+    def __init__(self,
+                 udp: Union[str, Sequence[str]] = DEFAULT_UDP,
+                 mode: str = "default",
+                 cache: Optional[ResultCache] = None,
+                 limits: Optional[ParseLimits] = None) -> None:
+        self.udp = udp
+        self.mode = mode
+        self.kits = KitRegistry.load([udp] if isinstance(udp, str) else udp)
+        self.registry = self.kits.registries[self.kits.default]
+        self.cache = cache
+        self.limits = limits
+        for patterns in SCHEMAS:
+            compile_schema(patterns)
+        if cache is not None:
+            # a sheet over a limit gets another result under other limits
+            self._schema_digest = schema_digest(SCHEMAS) + code_digest() + repr(limits)
+            self._registry_digests = [registry.digest or "" for registry in self.kits.registries.values()]
+
+    def kit(self, samplesheet: SampleSheet) -> str:
+        """
+        Returns the kit that best fits a parsed samplesheet, or the first
+        kit when there is only one or the sheet has no index pairs
+        """
+        if len(self.kits) == 1:
+            return self.kits.default
+        # eagerly parsed sheets do not list their sections
+        if samplesheet.sections is not None and "TSO500S_Data" not in samplesheet.sections:
+            return self.kits.default
+        data = samplesheet.data
+        if "index" not in data or "index2" not in data:
+            return self.kits.default
+        return self.kits.best_fit(data["index"], data["index2"]).kit
+
+    def context(self,
+                samplesheet: SampleSheet,
+                mode: Optional[str] = None,
+                kit: Optional[str] = None) -> SheetContext:
+        """
+        Returns a `SheetContext` for a samplesheet parsed with
+        `layout="columns"`, sharing the registry of `kit`, or of the kit
+        that best fits the sheet
+        """
+        kit = kit or self.kit(samplesheet)
+        return SheetContext(samplesheet, self.kits.files[kit], mode or self.mode, self.kits.registries[kit])
+
+    def check(self,
+              samplesheet: Source,
+              name: Optional[str] = None,
+              mode: Optional[str] = None,
+              profiler: Optional[Profiler] = None) -> ValidationResult:
+        """
+        Validates a samplesheet, running every stage to completion. With a
+        cache, a sheet whose bytes were checked before against the same
+        schema, registries and mode gets the cached result; profiled
+        checks always run.
+
+        Args:
+            samplesheet: path to a samplesheet file, or the samplesheet
+                itself as bytes, a memoryview, text (a `str` containing a
+                line break) or a file-like object
+            name: samplesheet name reported in the result; defaults to the
+                path, or `<samplesheet>` for in-memory samplesheets
+            mode: sample index selection mode for this check only
+            profiler: records the resources used by parsing and by each
+                validation stage, when given; profiled checks bypass the
+                cache
+
+        Returns:
+            a `ValidationResult` listing every issue found, and the kit it
+            was checked against when the checker has several
+        """
+        if profiler is not None:
+            return self._profile(samplesheet, name, mode, profiler)
+        if self.cache is None:
+            return self._check(samplesheet, name, mode)
+        digest, path, data = source_digest(samplesheet)
+        name = name or path or "<samplesheet>"
+        key = cache_key(digest, self._schema_digest, self._registry_digests, mode or self.mode)
+        result = self.cache.get(key, name)
+        if result is None:
+            result = self._check(data if path is None else path, name, mode)
+            self.cache.put(key, result)
+        return result
+
+    def parse(self, samplesheet: Source, profiler: Optional[Profiler] = None) -> SampleSheet:
+        """
+        Parses a samplesheet lazily, or in one streaming pass when the
+        checker has `limits`. With a profiler, every section is parsed up
+        front as stage `Parse`, so parsing is timed on its own rather than
+        spread over the stages that first read each section.
+        """
+        if profiler is not None:
+            with profiler.stage("Parse"):
+                samplesheet = self.parse(samplesheet)
+                samplesheet.json
+            return samplesheet
+        if self.limits is None:
+            return SampleSheet(samplesheet, lazy=True, layout="columns")
+        return SampleSheet(samplesheet, layout="columns", limits=self.limits)
+
+    def _profile(self,
+                 samplesheet: Source,
+                 name: Optional[str],
+                 mode: Optional[str],
+                 profiler: Profiler) -> ValidationResult:
+        """
+        Checks a samplesheet with a profiler, timing each stage. For peak
+        memory the check is run again in the profiler's traced pass, so
+        the timings are taken without memory tracing.
+        """
+        if not profiler.memory:
+            return self._check(samplesheet, name, mode, profiler)
+        if hasattr(samplesheet, "read"):
+            # a file-like object can only be read once
+            samplesheet = samplesheet.read()
+        result = self._check(samplesheet, name, mode, profiler)
+        with profiler.traced():
+            self._check(samplesheet, name, mode, profiler)
+        return result
+
+    def _check(self,
+               samplesheet: Source,
+               name: Optional[str] = None,
+               mode: Optional[str] = None,
+               profiler: Optional[Profiler] = None) -> ValidationResult:
+        source = samplesheet
+        try:
+            samplesheet = self.parse(samplesheet, profiler)
+        except ParseLimitError as e:
+            result = ValidationResult(name or source_name(source))
+            result.issues.append(Issue("Parse", "parse_limit", e.message, field=e.limit))
+            result.stages.append("Parse")
+            return result
+        name = name or samplesheet.filename or "<samplesheet>"
+        kit = self.kit(samplesheet)
+        result = run_stages(self.context(samplesheet, mode, kit), name, profiler)
+        if len(self.kits) > 1:
+            result.kit = kit
+        return result
@@ -1,21 +1,59 @@
 """
 Exceptions
 """
-from typing import List
+from typing import List, Optional
 
 
 class DuplicateKeyError(Exception):
     """
     Exception raised when duplicate keys are found during
-    dict-flattening.
+    dict-flattening, or while parsing a file in strict mode.
 
     Attributes:
         duplicate_keys: input keys which caused the error
+        lines: line number of each repeated key, when parsing a file
     """
 
-    def __init__(self, duplicate_keys: List) -> None:
+    def __init__(self, duplicate_keys: List, lines: Optional[List[int]] = None) -> None:
         self.duplicate_keys = duplicate_keys
+        self.lines = lines
+        if lines is not None:
+            duplicate_keys = [f"{key} (line {line})" for key, line in zip(duplicate_keys, lines)]
         self.message = "Duplicate keys found in input: {0}".format(
                 ', '.join(duplicate_keys)
                 )
         super().__init__(self.message)
+
+
+class InvalidSampleSheetError(Exception):
+    """
+    Exception raised when a samplesheet fails a check that stops
+    validation.
+
+    Attributes:
+        stage: name of the failed stage
+        message: description of the failure
+    """
+
+    def __init__(self, stage: str, message: str) -> None:
+        self.stage = stage
+        self.message = message
+        super().__init__(self.message)
+
+
+class ParseLimitError(Exception):
+    """
+    Exception raised when a file being parsed in streaming mode exceeds
+    one of its `ParseLimits`. Parsing stops at the offending line.
+
+    Attributes:
+        limit: name of the exceeded limit, e.g. `max_line_length`
+        line: 1-based line number where the limit was exceeded
+        message: description of the failure, starting with the line
+    """
+
+    def __init__(self, limit: str, line: int, message: str) -> None:
+        self.limit = limit
+        self.line = line
+        self.message = f"line {line}: {message}"
+        super().__init__(self.message)
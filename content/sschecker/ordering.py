@@ -0,0 +1,132 @@
+"""
+Index order checks against the row order of the UDP registry
+"""
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+
+class OrderBreak(NamedTuple):
+    """
+    A place where a column stops following the sheet's index order
+
+    Attributes:
+        row: 0-based row of the first value out of order; for a reversed
+            run, the row of its first value (the peak the run falls from)
+        value: the value at `row`
+        previous: the value it follows (empty for a reversed run starting
+            the column)
+        reversed_run: True when the break starts a run of three or more
+            values in reverse order that, read backwards, fits between its
+            neighbours (e.g. UDP0001, UDP0004, UDP0003, UDP0002, UDP0005);
+            False for a genuine misordering, including two swapped values
+        end: last row of the reversed run, or `row` for a misordering
+    """
+    row: int
+    value: str
+    previous: str
+    reversed_run: bool
+    end: int
+
+
+class OrderReport(object):
+    """
+    Result of checking the order of one index ID column
+
+    Attributes:
+        direction: `ascending` or `descending` registry order, whichever
+            most steps between consecutive ranked values follow; on a tie,
+            taken from the first and last ranked values
+        breaks: every `OrderBreak`, in row order
+        unranked: rows whose value is not in the rank table; they are
+            left out of the check
+    """
+    def __init__(self, direction: str = "ascending") -> None:
+        self.direction = direction
+        self.breaks: List[OrderBreak] = []
+        self.unranked: List[int] = []
+
+    @property
+    def is_ordered(self) -> bool:
+        """
+        True when the column follows registry order, either way round
+        """
+        return not self.breaks
+
+    @property
+    def misordered(self) -> List[OrderBreak]:
+        """
+        Breaks that are not an allowed reversed run
+        """
+        return [order_break for order_break in self.breaks if not order_break.reversed_run]
+
+    @property
+    def first_break(self) -> Optional[OrderBreak]:
+        return self.breaks[0] if self.breaks else None
+
+
+def check_order(values: Sequence[str], ranks: Dict[str, int]) -> OrderReport:
+    """
+    Checks that a column follows the order of a rank table in a single
+    linear pass. Repeated values (e.g. the DNA and RNA rows of a pair
+    sharing an index) are allowed, and so is a column in reverse order
+    throughout.
+
+    Runs going against the column's direction are classified as they
+    end: a run is an allowed reversed run when reading it backwards puts
+    it between the values before and after it, otherwise it is a
+    misordering.
+
+    Args:
+        values: index IDs, in row order
+        ranks: dict of index ID to its position in the registry
+
+    Returns:
+        an `OrderReport`
+    """
+    # (row, value, rank) of each ranked value that differs from the one before
+    steps = []
+    report = OrderReport()
+    for row, value in enumerate(values):
+        rank = ranks.get(value)
+        if rank is None:
+            report.unranked.append(row)
+        elif not steps or rank != steps[-1][2]:
+            steps.append((row, value, rank))
+    if len(steps) < 2:
+        return report
+
+    # comparing ranks in the column's direction, so ascending is "forward".
+    # The direction is that of most steps, so a run against it near either
+    # end of the column does not flip it
+    ups = sum(b[2] > a[2] for a, b in zip(steps, steps[1:]))
+    downs = len(steps) - 1 - ups
+    if ups != downs:
+        sign = -1 if downs > ups else 1
+    else:
+        sign = -1 if steps[-1][2] < steps[0][2] else 1
+    report.direction = "descending" if sign < 0 else "ascending"
+
+    i = 1
+    while i < len(steps):
+        if (steps[i][2] - steps[i - 1][2]) * sign > 0:
+            i += 1
+            continue
+        # steps[start] is the peak the backward run falls from
+        start = i - 1
+        while i + 1 < len(steps) and (steps[i + 1][2] - steps[i][2]) * sign < 0:
+            i += 1
+        peak, low = steps[start][2], steps[i][2]
+        fits_before = start == 0 or (low - steps[start - 1][2]) * sign > 0
+        fits_after = i + 1 == len(steps) or (steps[i + 1][2] - peak) * sign > 0
+        reversed_run = fits_before and fits_after and i > start + 1
+        if reversed_run:
+            # the run includes the peak it falls from
+            row, value, _ = steps[start]
+            previous = steps[start - 1][1] if start > 0 else ""
+            end = (steps[i + 1][0] if i + 1 < len(steps) else len(values)) - 1
+        else:
+            row, value, _ = steps[start + 1]
+            previous = steps[start][1]
+            end = row
+        report.breaks.append(OrderBreak(row, value, previous, reversed_run, end))
+        i += 1
+    return report
@@ -0,0 +1,108 @@
+"""
+DNA/RNA sample pairing checks
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Sample_ID suffix -> (analyte, suffix of the partner sample)
+SAMPLE_TYPES = {
+    "-D": ("DNA", "-R"),
+    "-R": ("RNA", "-D"),
+}
+
+
+class PairingReport(object):
+    """
+    Result of checking the D/R pairing of a sheet's samples. Every list
+    entry starts with the 0-based row position of the offending sample.
+
+    Attributes:
+        duplicates: (row, Sample_ID) for each repeated Sample_ID
+        malformed: (row, Sample_ID) for IDs ending in neither `-D` nor `-R`
+        unpaired: (row, Sample_ID, partner Sample_ID) for samples whose
+            D/R partner is missing
+        mismatched: (row, Sample_ID, reason) for samples whose Pair_ID or
+            Sample_Type disagrees with the pair
+    """
+    def __init__(self) -> None:
+        self.duplicates: List[Tuple[int, str]] = []
+        self.malformed: List[Tuple[int, str]] = []
+        self.unpaired: List[Tuple[int, str, str]] = []
+        self.mismatched: List[Tuple[int, str, str]] = []
+
+    @property
+    def is_valid(self) -> bool:
+        """
+        True when no pairing problem was found
+        """
+        return not (self.duplicates or self.malformed or self.unpaired or self.mismatched)
+
+    def messages(self) -> List[str]:
+        """
+        Returns a description of each problem, in the order they were found
+        """
+        messages = [f"Sample_ID is not unique: {sample_id}" for _, sample_id in self.duplicates]
+        messages += [
+            f"Sample format need to be either DNA or RNA: {sample_id}"
+            for _, sample_id in self.malformed
+        ]
+        for _, sample_id, partner_id in self.unpaired:
+            analyte = SAMPLE_TYPES[partner_id[-2:]][0]
+            messages.append(f"{analyte} sample pair for sample: {sample_id} is required")
+        messages += [f"{sample_id}: {reason}" for _, sample_id, reason in self.mismatched]
+        return messages
+
+
+def check_pairs(sample_ids: Sequence[str],
+                pair_ids: Optional[Sequence[str]] = None,
+                sample_types: Optional[Sequence[str]] = None) -> PairingReport:
+    """
+    Checks that every DNA sample (`<domain>-D`) has an RNA partner
+    (`<domain>-R`) and vice versa, in linear time. Each Sample_ID is split
+    once into its domain and type, and partners are found through a hash
+    index over the samples, so all duplicated, malformed and unpaired
+    samples are reported in one pass.
+
+    Args:
+        sample_ids: Sample_ID of each row
+        pair_ids: Pair_ID of each row; when given, both samples of a pair
+            must share it
+        sample_types: Sample_Type of each row; when given, it must be DNA
+            for `-D` samples and RNA for `-R` samples
+
+    Returns:
+        a `PairingReport`
+    """
+    report = PairingReport()
+    rows: Dict[str, int] = {}
+    # (row, Sample_ID, partner Sample_ID) of each well-formed sample
+    samples: List[Tuple[int, str, str]] = []
+
+    for row, sample_id in enumerate(sample_ids):
+        if sample_id in rows:
+            report.duplicates.append((row, sample_id))
+            continue
+        rows[sample_id] = row
+
+        domain, suffix = sample_id[:-2], sample_id[-2:]
+        if suffix not in SAMPLE_TYPES:
+            report.malformed.append((row, sample_id))
+            continue
+
+        analyte, partner_suffix = SAMPLE_TYPES[suffix]
+        samples.append((row, sample_id, domain + partner_suffix))
+        if sample_types is not None and sample_types[row] != analyte:
+            report.mismatched.append(
+                (row, sample_id, f"Sample_Type {sample_types[row]} should be {analyte}")
+            )
+
+    for row, sample_id, partner_id in samples:
+        partner_row = rows.get(partner_id)
+        if partner_row is None:
+            report.unpaired.append((row, sample_id, partner_id))
+        elif pair_ids is not None and row < partner_row and pair_ids[row] != pair_ids[partner_row]:
+            # reported once per pair, against whichever sample comes first
+            report.mismatched.append(
+                (row, sample_id, f"Pair_ID {pair_ids[row]} differs from {pair_ids[partner_row]} of {partner_id}")
+            )
+
+    return report
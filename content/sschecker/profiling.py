@@ -0,0 +1,212 @@
+"""
+Per-stage timing and profiling of samplesheet checks
+"""
+import cProfile
+from contextlib import contextmanager
+import json
+import os
+import time
+import tracemalloc
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+
+class StageTiming(NamedTuple):
+    """
+    Resources used by one stage of a check
+
+    Attributes:
+        stage: stage name
+        start: wall-clock start in seconds, relative to the profiler's creation
+        wall: elapsed wall time in seconds
+        cpu: process CPU time in seconds
+        peak_memory: peak memory allocated during the stage, in bytes above
+            what was allocated when it started, from the traced pass; None
+            when memory was not measured
+    """
+    stage: str
+    start: float
+    wall: float
+    cpu: float
+    peak_memory: Optional[int]
+
+
+class Profiler(object):
+    """
+    Records wall time, CPU time and peak memory of each stage of a check.
+    Stages run one after another, either as `with profiler.stage(name):`
+    blocks or by calling `profiler.switch(name)` at the start of each stage
+    and `profiler.stop()` after the last one.
+
+    Basic usage:
+
+        >>> profiler = Profiler(memory=True, cprofile=True)
+        >>> result = Checker().check("SampleSheet.csv", profiler=profiler)
+        >>> print(profiler.table())
+        >>> profiler.write_trace("SampleSheet.trace.json")
+        >>> profiler.dump_hottest("SampleSheet.prof")
+
+    Memory tracing (`tracemalloc`) slows allocation-heavy stages down by
+    an order of magnitude, so times are never taken with it running. With
+    `memory=True`, the check is run a second time inside `traced()`, and
+    that pass only records each stage's peak memory. `cprofile` still
+    slows the timed pass down; times taken with it are comparable to each
+    other, not to an unprofiled check.
+
+    Attributes:
+        enabled: False for a profiler that records nothing
+        memory: measure peak memory per stage, in a separate traced pass
+        cprofile: keep a cProfile profile of the slowest stage
+        timings: `StageTiming` of each finished stage, in order
+    """
+    def __init__(self, enabled: bool = True, memory: bool = False, cprofile: bool = False) -> None:
+        self.enabled = enabled
+        self.memory = memory
+        self.cprofile = cprofile
+        self.timings: List[StageTiming] = []
+        self._origin = time.perf_counter()
+        self._current = None
+        self._profile = None
+        self._hottest = None
+        # peak memory per stage while in a traced pass, else None
+        self._peaks: Optional[Dict[str, int]] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Times the enclosed block as stage `name`
+        """
+        self.switch(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    @contextmanager
+    def traced(self) -> Iterator[None]:
+        """
+        Runs the enclosed block as the memory pass: stages switched to
+        inside it record only their peak memory, which is added to the
+        timings of the stages of the same name when the block ends
+        """
+        if not self.enabled:
+            yield
+            return
+        self.stop()
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        self._peaks = {}
+        try:
+            yield
+        finally:
+            self.stop()
+            peaks, self._peaks = self._peaks, None
+            if started:
+                tracemalloc.stop()
+            self.timings = [timing._replace(peak_memory=peaks.get(timing.stage)) for timing in self.timings]
+
+    def switch(self, name: str) -> None:
+        """
+        Ends the running stage, if any, and starts stage `name`
+        """
+        if not self.enabled:
+            return
+        self.stop()
+        if self._peaks is not None:
+            tracemalloc.reset_peak()
+            self._current = (name, None, None, tracemalloc.get_traced_memory()[0])
+            return
+        if self.cprofile:
+            self._profile = cProfile.Profile()
+        self._current = (name, time.perf_counter(), time.process_time(), None)
+        if self._profile is not None:
+            self._profile.enable()
+
+    def stop(self) -> None:
+        """
+        Ends the running stage, if any
+        """
+        if self._current is None:
+            return
+        if self._peaks is not None:
+            name, _, _, allocated = self._current
+            peak = max(0, tracemalloc.get_traced_memory()[1] - allocated)
+            self._peaks[name] = max(peak, self._peaks.get(name, 0))
+            self._current = None
+            return
+        if self._profile is not None:
+            self._profile.disable()
+        wall_end, cpu_end = time.perf_counter(), time.process_time()
+        name, wall_start, cpu_start, _ = self._current
+        timing = StageTiming(name, wall_start - self._origin, wall_end - wall_start, cpu_end - cpu_start, None)
+        self.timings.append(timing)
+
+        if self._profile is not None and (self._hottest is None or timing.wall > self._hottest[0].wall):
+            self._hottest = (timing, self._profile)
+        self._current = None
+        self._profile = None
+
+    def close(self) -> None:
+        """
+        Ends the running stage
+        """
+        self.stop()
+
+    @property
+    def hottest(self) -> Optional[StageTiming]:
+        """
+        The stage that took the most wall time
+        """
+        return max(self.timings, key=lambda timing: timing.wall, default=None)
+
+    def table(self) -> str:
+        """
+        Returns the timings as a text table
+        """
+        lines = [f"{'stage':<22} {'wall (ms)':>10} {'cpu (ms)':>10} {'peak (KiB)':>11}"]
+        for timing in self.timings:
+            peak = "-" if timing.peak_memory is None else f"{timing.peak_memory / 1024:.1f}"
+            lines.append(f"{timing.stage:<22} {timing.wall * 1e3:>10.2f} {timing.cpu * 1e3:>10.2f} {peak:>11}")
+        lines.append(f"{'total':<22} {sum(t.wall for t in self.timings) * 1e3:>10.2f}"
+                     f" {sum(t.cpu for t in self.timings) * 1e3:>10.2f}")
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns the timings as a JSON-serializable trace. `traceEvents`
+        holds the stages in the Chrome trace event format, so the trace
+        can also be opened in chrome://tracing or Perfetto.
+        """
+        hottest = self.hottest
+        return {
+            "stages": [timing._asdict() for timing in self.timings],
+            "hottest": None if hottest is None else hottest.stage,
+            "traceEvents": [
+                {"name": timing.stage, "ph": "X", "pid": os.getpid(), "tid": 0,
+                 "ts": round(timing.start * 1e6), "dur": round(timing.wall * 1e6),
+                 "args": {"cpu_ms": timing.cpu * 1e3, "peak_memory": timing.peak_memory}}
+                for timing in self.timings
+            ],
+        }
+
+    def write_trace(self, path: str) -> str:
+        """
+        Writes the JSON trace to `path` and returns the path
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    def dump_hottest(self, path: str) -> Optional[str]:
+        """
+        Writes the cProfile statistics of the slowest stage to `path`, to
+        be read with `pstats` or snakeviz
+
+        Returns:
+            name of the profiled stage, or None when `cprofile` was off
+        """
+        if self._hottest is None:
+            return None
+        timing, profile = self._hottest
+        profile.dump_stats(path)
+        return timing.stage
@@ -0,0 +1,227 @@
+"""
+Buffered reporting of check progress and results
+
+Messages are collected per stage and handed to a sink in one go when the
+stage ends, so a check makes one write per stage instead of one per line.
+In Pyodide every write crosses into the browser, which is slow.
+
+Basic usage:
+
+    >>> reporter = Reporter(TextSink(), level=NORMAL)
+    >>> reporter.switch("Header")
+    >>> reporter.failure("Invalid keys: ['RunName']")
+    >>> reporter.verdict(">> Samplesheet is invalid", valid=False)
+    >>> reporter.close()
+"""
+import html
+import json
+import sys
+from typing import Callable, List, NamedTuple, Optional, TextIO
+
+# verbosity levels: QUIET reports the verdict and failures only, NORMAL
+# adds stage banners and passed checks, VERBOSE adds the schema patterns
+QUIET = 0
+NORMAL = 1
+VERBOSE = 2
+
+# level at which each kind of record is reported
+LEVELS = {
+    "valid": QUIET,
+    "invalid": QUIET,
+    "failure": QUIET,
+    "warning": QUIET,
+    "stage": NORMAL,
+    "info": NORMAL,
+    "detail": VERBOSE,
+}
+
+BANNER = "==============================================================="
+
+
+class Record(NamedTuple):
+    """
+    One reported message
+
+    Attributes:
+        kind: `stage`, `info`, `detail`, `warning`, `failure`, or `valid` /
+            `invalid` for the verdict
+        message: text of the message
+    """
+    kind: str
+    message: str
+
+
+class TextSink(object):
+    """
+    Writes plain text to a stream, stdout by default
+    """
+    def __init__(self, stream: Optional[TextIO] = None) -> None:
+        self.stream = stream
+
+    def write(self, stage: Optional[str], records: List[Record]) -> None:
+        lines = []
+        for record in records:
+            if record.kind == "stage":
+                lines += [BANNER, f"Validating {record.message}", BANNER]
+            else:
+                lines.append(record.message)
+        stream = self.stream or sys.stdout
+        stream.write("\n".join(lines) + "\n")
+        stream.flush()
+
+
+class HtmlSink(object):
+    """
+    Renders records as HTML, e.g. for a notebook output area. `emit` is
+    called with each stage's HTML; by default it is displayed with
+    IPython in a notebook, and written to `stream` (stdout by default)
+    elsewhere, e.g. on the command line.
+    """
+    STYLES = {
+        "stage": "font-weight: bold; margin-top: 0.5em",
+        "detail": "color: #666",
+        "warning": "color: #b36b00",
+        "failure": "color: #c00",
+        "valid": "font-weight: bold; color: #070",
+        "invalid": "font-weight: bold; color: #c00",
+    }
+
+    def __init__(self, emit: Optional[Callable[[str], None]] = None, stream: Optional[TextIO] = None) -> None:
+        self.emit = emit or self._display
+        self.stream = stream
+
+    def _display(self, fragment: str) -> None:
+        try:
+            from IPython import get_ipython
+            from IPython.display import HTML, display
+        except ImportError:
+            get_ipython = None
+        if get_ipython is not None and get_ipython() is not None:
+            display(HTML(fragment))
+            return
+        stream = self.stream or sys.stdout
+        stream.write(fragment + "\n")
+        stream.flush()
+
+    def write(self, stage: Optional[str], records: List[Record]) -> None:
+        lines = [
+            f'<div style="{self.STYLES.get(record.kind, "")}">'
+            f'{html.escape("Validating " + record.message if record.kind == "stage" else record.message)}</div>'
+            for record in records
+        ]
+        self.emit('<div style="font-family: monospace">' + "".join(lines) + "</div>")
+
+
+class JsonLinesSink(object):
+    """
+    Writes one JSON object per record to a stream, stdout by default
+    """
+    def __init__(self, stream: Optional[TextIO] = None) -> None:
+        self.stream = stream
+
+    def write(self, stage: Optional[str], records: List[Record]) -> None:
+        stream = self.stream or sys.stdout
+        stream.write("".join(
+            json.dumps({"stage": stage, "kind": record.kind, "message": record.message}) + "\n"
+            for record in records
+        ))
+        stream.flush()
+
+
+class NullSink(object):
+    """
+    Discards everything
+    """
+    def write(self, stage: Optional[str], records: List[Record]) -> None:
+        pass
+
+
+SINKS = {
+    "text": TextSink,
+    "html": HtmlSink,
+    "jsonl": JsonLinesSink,
+    "null": NullSink,
+}
+
+
+class Reporter(object):
+    """
+    Collects the messages of a check and writes them to a sink once per
+    stage. Messages above the reporter's verbosity level are dropped when
+    they are reported, so quiet checks do not build them up.
+
+    Attributes:
+        sink: where messages are written (`TextSink`, `HtmlSink`,
+            `JsonLinesSink` or `NullSink`)
+        level: verbosity, `QUIET` (default), `NORMAL` or `VERBOSE`
+    """
+    def __init__(self, sink=None, level: int = QUIET) -> None:
+        self.sink = sink if sink is not None else TextSink()
+        self.level = level
+        self._stage: Optional[str] = None
+        self._records: List[Record] = []
+
+    def enabled(self, kind: str) -> bool:
+        """
+        True when records of `kind` are reported at this verbosity
+        """
+        return LEVELS[kind] <= self.level
+
+    def report(self, kind: str, message: str) -> None:
+        if LEVELS[kind] <= self.level:
+            self._records.append(Record(kind, message))
+
+    def switch(self, stage: str) -> None:
+        """
+        Flushes the running stage and starts `stage`
+        """
+        self.flush()
+        self._stage = stage
+        self.report("stage", stage)
+
+    def info(self, message: str) -> None:
+        self.report("info", message)
+
+    def detail(self, message: str) -> None:
+        self.report("detail", message)
+
+    def warning(self, message: str) -> None:
+        self.report("warning", message)
+
+    def failure(self, message: str) -> None:
+        self.report("failure", message)
+
+    def verdict(self, message: str, valid: bool) -> None:
+        """
+        Reports the outcome of a check and flushes
+        """
+        self.flush()
+        self._stage = None
+        self.report("valid" if valid else "invalid", message)
+        self.flush()
+
+    def result(self, result, suffix: str = "") -> None:
+        """
+        Reports the issues of a `ValidationResult`, one stage per
+        samplesheet section, followed by its verdict
+        """
+        for issue in result.issues:
+            if issue.section != self._stage:
+                self.switch(issue.section)
+            self.report("failure" if issue.severity == "error" else "warning",
+                        f"[{issue.severity}] [{issue.section}] {issue.message}")
+        kit = f" against UDP kit {result.kit}" if result.kit is not None else ""
+        self.verdict(f">> Samplesheet is {result.verdict}{kit}: {len(result.errors)} errors,"
+                     f" {len(result.warnings)} warnings{suffix}", result.is_valid)
+
+    def flush(self) -> None:
+        """
+        Writes the buffered messages of the running stage to the sink
+        """
+        if self._records:
+            records, self._records = self._records, []
+            self.sink.write(self._stage, records)
+
+    def close(self) -> None:
+        self.flush()
+        self._stage = None
@@ -0,0 +1,225 @@
+"""
+Content-addressed cache of validation results
+
+A result is stored under a key hashing everything that decides it: the
+samplesheet bytes, the schema patterns, the source of the checking code,
+the UDP registry contents and the index selection mode. Editing
+`schema.py`, the checker or a registry file therefore changes the key,
+and results checked before the change are simply never looked up again.
+"""
+from collections import OrderedDict
+import copy
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, Optional
+
+from results import ValidationResult
+from samplesheetparser import IlluminaFile, Source
+
+# modules whose code decides a result; their source is part of the key
+CHECKER_MODULES = ("barcodes", "checker", "ordering", "pairing", "results", "samplesheetparser",
+                   "schemaplan", "udpregistry", "validation")
+
+# bytes read at a time when hashing a samplesheet on disk
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_code_digest: Optional[str] = None
+
+
+def code_digest() -> str:
+    """
+    Returns a sha256 of the source of `CHECKER_MODULES`, computed once
+    per process
+    """
+    global _code_digest
+    if _code_digest is None:
+        digest = hashlib.sha256()
+        for module in CHECKER_MODULES:
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{module}.py"), "rb") as f:
+                digest.update(f.read())
+        _code_digest = digest.hexdigest()
+    return _code_digest
+
+
+def source_digest(source: Source):
+    """
+    Hashes a samplesheet given as a path or as its contents
+
+    Returns:
+        the sha256 of its bytes, its path (None for in-memory contents),
+        and the in-memory contents (None for a path), which should be
+        checked instead of `source` since a file-like source has been read
+    """
+    path, data = IlluminaFile._source(source)
+    if path is None:
+        return hashlib.sha256(data).hexdigest(), None, data
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest(), path, None
+
+
+def cache_key(sheet: str, schema: str, registries: Iterable[str], mode: str) -> str:
+    """
+    Combines the digests of a samplesheet, the schema and code, and the
+    registries with the index selection mode into one cache key
+    """
+    return hashlib.sha256("\n".join([sheet, schema, *registries, mode]).encode()).hexdigest()
+
+
+class ResultCache(object):
+    """
+    Two-tier cache of `ValidationResult`s: an in-memory LRU tier and, when
+    `cache_dir` is given, an on-disk tier shared between processes (e.g.
+    batch or service workers). Disk entries are JSON files; when they
+    take more than `max_bytes`, the least recently used are removed.
+
+    Results are cached without the name they were checked under, so a
+    sheet uploaded again under another name is still a hit.
+
+    Basic usage:
+
+        >>> checker = Checker(cache=ResultCache(cache_dir=CACHE_DIR))
+        >>> checker.check("SampleSheet.csv")  # checked
+        >>> checker.check("SampleSheet.csv")  # from the cache
+        >>> checker.cache.hits
+
+    Attributes:
+        maxsize: number of results kept in memory
+        cache_dir: directory of the disk tier, or None for memory only
+        max_bytes: size limit of the disk tier
+        hits: lookups answered from memory or disk
+        misses: lookups that found nothing
+    """
+    def __init__(self,
+                 maxsize: int = 256,
+                 cache_dir: Optional[str] = None,
+                 max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.maxsize = maxsize
+        self.cache_dir = None if cache_dir is None else os.path.join(cache_dir, "results")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, ValidationResult]" = OrderedDict()
+        self._disk_bytes: Optional[int] = None
+
+    def get(self, key: str, name: str) -> Optional[ValidationResult]:
+        """
+        Returns a copy of the result cached under `key`, named `name`, or
+        None
+        """
+        result = self._memory.get(key)
+        if result is not None:
+            self._memory.move_to_end(key)
+        else:
+            result = self._load(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._remember(key, result)
+        self.hits += 1
+        # issues are tuples; copying the lists keeps the cached result intact
+        result = copy.copy(result)
+        result.samplesheet = name
+        result.issues = list(result.issues)
+        result.stages = list(result.stages)
+        return result
+
+    def put(self, key: str, result: ValidationResult) -> None:
+        """
+        Caches a copy of `result` under `key`
+        """
+        result = copy.copy(result)
+        result.issues = list(result.issues)
+        result.stages = list(result.stages)
+        self._remember(key, result)
+        if self.cache_dir is not None:
+            self._store(key, result)
+
+    def clear(self) -> None:
+        """
+        Empties the memory tier; the disk tier is left as it is
+        """
+        self._memory.clear()
+
+    def _remember(self, key: str, result: ValidationResult) -> None:
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load(self, key: str) -> Optional[ValidationResult]:
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                result = ValidationResult.from_dict(json.load(f))
+            # the modification time orders entries for eviction
+            os.utime(path)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return result
+
+    def _store(self, key: str, result: ValidationResult) -> None:
+        content = result.to_json(indent=None).encode()
+        path = self._path(key)
+        # written under a temporary name first, so that other processes
+        # never read a partly written entry
+        temporary = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(temporary, "wb") as f:
+                f.write(content)
+            os.replace(temporary, path)
+        except OSError:
+            return
+        if self._disk_bytes is None:
+            self._disk_bytes = self._disk_usage()[0]
+        else:
+            self._disk_bytes += len(content)
+        if self._disk_bytes > self.max_bytes:
+            self._evict()
+
+    def _disk_usage(self):
+        """
+        Returns the total size of the disk tier, and its entries as
+        (modification time, size, path), oldest first
+        """
+        entries = []
+        with os.scandir(self.cache_dir) as scanned:
+            for entry in scanned:
+                if entry.name.endswith(".json"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        entries.sort()
+        return sum(size for _, size, _ in entries), entries
+
+    def _evict(self) -> None:
+        """
+        Removes the least recently used disk entries until the tier is
+        back to three quarters of `max_bytes`, so it is not scanned again
+        on the very next write
+        """
+        total, entries = self._disk_usage()
+        for _, size, path in entries:
+            if total <= self.max_bytes * 3 // 4:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        self._disk_bytes = total
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "memory": len(self._memory),
+                "disk_bytes": self._disk_bytes or 0}
@@ -0,0 +1,122 @@
+"""
+Structured, machine-readable validation results
+"""
+import json
+import os
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+class Issue(NamedTuple):
+    """
+    A single problem found in a samplesheet.
+
+    Attributes:
+        section: samplesheet section, e.g. `TSO500S_Data`
+        rule: identifier of the rule that failed, e.g. `pattern`, `dr_pair`
+        message: human-readable description
+        field: field or column name, if the problem concerns one
+        row: 0-based data row within the section, for tabular sections
+        value: offending value
+        severity: `error`, or `warning` for problems that do not make the
+            sheet invalid (e.g. index order in `skip` mode)
+    """
+    section: str
+    rule: str
+    message: str
+    field: Optional[str] = None
+    row: Optional[int] = None
+    value: Optional[str] = None
+    severity: str = "error"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns the issue as a JSON-serializable dict
+        """
+        issue = self._asdict()
+        if self.row is not None:
+            issue["row"] = int(self.row)
+        if self.value is not None and not isinstance(self.value, str):
+            issue["value"] = None if self.value != self.value else str(self.value)
+        return issue
+
+
+class ValidationResult(object):
+    """
+    Outcome of validating one samplesheet with every stage run to
+    completion.
+
+    Attributes:
+        samplesheet: path (or name) of the samplesheet
+        issues: every problem found, in stage order
+        stages: names of the stages that were run
+        kit: UDP kit the sheet was checked against, when chosen among
+            several registries
+    """
+    def __init__(self, samplesheet: str) -> None:
+        self.samplesheet = samplesheet
+        self.issues: List[Issue] = []
+        self.stages: List[str] = []
+        self.kit: Optional[str] = None
+
+    @property
+    def errors(self) -> List[Issue]:
+        return [issue for issue in self.issues if issue.severity == "error"]
+
+    @property
+    def warnings(self) -> List[Issue]:
+        return [issue for issue in self.issues if issue.severity != "error"]
+
+    @property
+    def is_valid(self) -> bool:
+        """
+        True when no error was found; warnings do not count
+        """
+        return len(self.errors) == 0
+
+    @property
+    def verdict(self) -> str:
+        return "valid" if self.is_valid else "invalid"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns the result as a JSON-serializable dict
+        """
+        result = {
+            "samplesheet": self.samplesheet,
+            "verdict": self.verdict,
+            "errors": len(self.errors),
+            "warnings": len(self.warnings),
+            "stages": self.stages,
+            "issues": [issue.to_dict() for issue in self.issues]
+        }
+        if self.kit is not None:
+            result["kit"] = self.kit
+        return result
+
+    @classmethod
+    def from_dict(cls, result: Dict[str, Any]) -> "ValidationResult":
+        """
+        Rebuilds a result from `to_dict()` output
+        """
+        validation_result = cls(result["samplesheet"])
+        validation_result.stages = list(result["stages"])
+        validation_result.issues = [Issue(**issue) for issue in result["issues"]]
+        validation_result.kit = result.get("kit")
+        return validation_result
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def write(self, output: str) -> str:
+        """
+        Writes the result as `<output>/<samplesheet name>.json`
+
+        Returns:
+            path of the written file
+        """
+        os.makedirs(output, exist_ok=True)
+        name = os.path.splitext(os.path.basename(self.samplesheet))[0]
+        path = os.path.join(output, f"{name}.json")
+        with open(path, "w") as f:
+            f.write(self.to_json())
+        return path
@@ -1,18 +1,162 @@
 """
 Classes for parsing files used in, and produced by, Illumina's TSO500 app
 """
-from collections import Counter, ChainMap
-from functools import reduce
+from collections import Counter
+from contextlib import contextmanager
+import csv
+import io
+from itertools import chain, islice, repeat
+import os
 import re
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterator, NamedTuple, Optional, Union, TYPE_CHECKING
 
-import pandas as pd
+try:
+    import mmap
+except ImportError:
+    # e.g. some Pyodide builds; files are then read into memory
+    mmap = None
+
+if TYPE_CHECKING:
+    # pandas is optional; it is only imported to build DataFrames
+    import pandas as pd
 
 # from constants import TMB_FIELDS, MSI_FIELDS
-from exceptions import DuplicateKeyError
+from exceptions import DuplicateKeyError, ParseLimitError
 
 JSONType = Dict[Dict[str, Any], List[Dict[str, Any]]]
 
+# a path, the contents of a file (bytes, memoryview, or text containing a
+# line break), or a file-like object
+Source = Union[str, os.PathLike, bytes, bytearray, memoryview, io.IOBase]
+
+# files at least this large are memory-mapped rather than read into memory
+MMAP_MIN_SIZE = 1 << 20
+
+
+class SectionSpan(NamedTuple):
+    """
+    Location of a `[Section]` within a file, as recorded by the lazy
+    index scan. Line numbers are 1-based and inclusive.
+    """
+    offset: int
+    length: int
+    first_line: int
+    last_line: int
+
+
+class ParseLimits(NamedTuple):
+    """
+    Guards of the streaming parse against malformed or hostile files,
+    e.g. an Excel export with a multi-megabyte line. Each limit can be
+    set to None to lift it. The defaults are far above any real TSO500
+    samplesheet: `max_rows` leaves headroom over the 50,000-row sheets
+    the benchmarks use, and `max_bytes` is the guard that bounds memory.
+
+    Attributes:
+        max_line_length: longest line, in bytes without the line break
+        max_rows: most non-empty rows in one section, counting its header
+            and column names
+        max_sections: most section headers, repeats included
+        max_bytes: largest file, in bytes
+    """
+    max_line_length: Optional[int] = 64 * 1024
+    max_rows: Optional[int] = 200_000
+    max_sections: Optional[int] = 64
+    max_bytes: Optional[int] = 16 * 1024 * 1024
+
+
+class Duplicate(NamedTuple):
+    """
+    A name repeated within a file, as recorded while it is parsed. Line
+    numbers are 1-based.
+
+    Attributes:
+        kind: `key` (in a record section), `column` (in a tabular
+            section's column names) or `section` (a repeated `[Section]`
+            header)
+        section: section holding the repeated name; for `section`, the
+            repeated section itself
+        name: the repeated name
+        line: line of the repeat
+        first_line: line where the name first appeared
+    """
+    kind: str
+    section: str
+    name: str
+    line: int
+    first_line: int
+
+    @property
+    def label(self) -> str:
+        if self.kind == "section":
+            return f"[{self.section}]"
+        if self.kind == "column":
+            return f"[{self.section}] column {self.name}"
+        return f"[{self.section}] {self.name}"
+
+
+class Table(object):
+    """
+    Column-oriented storage for a tabular section: one list of values
+    per column. Used in place of a list of row dicts when an
+    `IlluminaFile` is read with `layout="columns"`.
+
+    Basic usage:
+
+        >>> table = SampleSheet("SampleSheet.csv", layout="columns").data
+        >>> table["Sample_ID"]
+        >>> df = table.to_dataframe()
+
+    Attributes:
+        columns: dict of column name to list of values
+    """
+    def __init__(self, column_names: List[str], rows: List[List[str]] = []) -> None:
+        """
+        Inits Table by transposing `rows`, which must already be padded
+        to at least `len(column_names)` cells. As with row dicts, the last
+        of any repeated column names wins.
+        """
+        n_columns = len(column_names)
+        if rows:
+            values = map(list, islice(zip(*rows), n_columns))
+        else:
+            values = ([] for i in range(n_columns))
+        self.columns = {}
+        for name, column in zip(column_names, values):
+            self.columns[name] = column
+        self._n_rows = len(rows)
+
+    def __getitem__(self, name: str) -> List[str]:
+        return self.columns[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def keys(self):
+        """
+        Returns the column names
+        """
+        return self.columns.keys()
+
+    def records(self) -> List[Dict[str, str]]:
+        """
+        Returns the rows as a list of dicts, as in the default layout
+        """
+        names = list(self.columns)
+        return [dict(zip(names, row)) for row in zip(*self.columns.values())]
+
+    def to_dataframe(self) -> "pd.DataFrame":
+        """
+        Returns the table as a `pd.DataFrame`, built directly from the
+        column lists. Requires pandas.
+        """
+        import pandas as pd
+
+        return pd.DataFrame(self.columns, copy=False)
+
 
 class IlluminaFile(object):
     """
@@ -25,17 +169,26 @@ class IlluminaFile(object):
     with those files instead.
 
     Attributes:
-        filename: path to file
+        filename: path to file, or None when parsing in-memory contents
         json: contents of the file as a dict
+        sections: byte offset and line span of each section (lazy mode only)
+        layout: storage of tabular sections, `"records"` or `"columns"`
+        duplicates: repeated keys, column names and section headers found
+            so far, in line order (see `Duplicate`)
 
     Refer to derived classes for examples of usage.
     """
     def __init__(self,
-                 filename: str = None,
+                 filename: Source = None,
                  delim: str = None,
                  skip: int = 0,
                  tabular_sections: List[str] = [],
-                 array_sections: List[str] = []) -> None:
+                 array_sections: List[str] = [],
+                 engine: str = "csv",
+                 lazy: bool = False,
+                 layout: str = "records",
+                 strict: bool = False,
+                 limits: Optional[ParseLimits] = None) -> None:
         """
         Inits IlluminaFile with filename, delimiter, the number of
         lines to skip (due to boilerplate lines at the top of some
@@ -45,30 +198,96 @@ class IlluminaFile(object):
             - `tabular sections` are handled as delimiter-separated data;
             - `array sections` are handled as simple lists of data
 
+        Two parsing engines are available. The default `"csv"` engine
+        tokenizes the file in a single pass with the C-level `csv` module,
+        which also handles quoted fields. The `"python"` engine is the
+        original line-by-line parser, kept for comparison. The `"stream"`
+        engine reads the file one line at a time instead of decoding it
+        whole, enforcing `limits` as it goes: a file exceeding one raises
+        a `ParseLimitError` naming the offending line, after reading no
+        more than that line. File-like objects are read incrementally
+        rather than up front.
+
+        In `lazy` mode the file is not parsed up front. Instead a cheap
+        scan records where each section starts and ends, and each section
+        is parsed on first access through `IlluminaFile._section()`.
+
+        The file can be given as a path or as its contents: bytes, a
+        memoryview (e.g. an ipywidgets upload buffer, used without copying),
+        text containing a line break, or a file-like object. Files on disk
+        of at least `MMAP_MIN_SIZE` bytes are read through a memory map.
+
+        Tabular sections are stored as a list of row dicts by default. With
+        `layout="columns"` they are stored as a `Table` instead, which holds
+        one list per column and converts to a `pd.DataFrame` without
+        going through row dicts.
+
+        Keys repeated within a record section, repeated column names and
+        repeated section headers are recorded in `duplicates` with their
+        line numbers as the file is tokenized; as before, the last
+        occurrence is the one kept. With `strict=True` the first repeat
+        raises a `DuplicateKeyError` instead. In lazy mode, repeats within
+        a section are only found once that section is parsed.
+
         Note that derived classes set many of these arguments as defaults,
         not to be set by the user.
 
         Args:
-            filename: path to file
+            filename: path to file, or the file contents
             delim: file delimiter (e.g. `","` `"\t"` etc.)
             skip: number of lines to skip over before parsing the file
             tabular_sections: List of sections where the data is formatted as
                 delimiter-separated data
             array_sections: List of sections where the data is formatted as
                 a simple list of entries
+            engine: parsing engine, `"csv"` (default), `"python"` or
+                `"stream"`
+            lazy: index the file and parse sections on demand (not with
+                the stream engine)
+            layout: storage for tabular sections, either `"records"`
+                (default) or `"columns"`
+            strict: raise `DuplicateKeyError` on repeated keys, column
+                names or section headers
+            limits: guards of the stream engine; `ParseLimits()` by default
         """
-        self.filename = filename
+        if engine not in ("csv", "python", "stream"):
+            raise ValueError(f"Unknown parsing engine: {engine}")
+        if engine == "stream" and lazy:
+            raise ValueError("The stream engine parses the whole file in one pass")
+        if layout not in ("records", "columns"):
+            raise ValueError(f"Unknown tabular layout: {layout}")
+        if engine == "python" and layout == "columns":
+            raise ValueError("The columns layout requires the csv engine")
+        if engine == "stream" and hasattr(filename, "read"):
+            self.filename, self._data, self._file = None, None, filename
+        else:
+            self.filename, self._data = self._source(filename)
+            self._file = None
         self._tabular_sections = tabular_sections
         self._array_sections = array_sections
         self._delim = delim
         self._skip = skip
-        self.json = None
+        self._engine = engine
+        self.layout = layout
+        self._columnar = layout == "columns"
+        self._strict = strict
+        self._limits = limits if limits is not None else ParseLimits()
+        self._loaded = {}
+        self._duplicates: Dict[Duplicate, None] = {}
+        if lazy:
+            self._json = None
+            self.sections = self._index()
+        else:
+            self.sections = None
+            self.json = None
 
     @property
     def json(self) -> JSONType:
         """
         Contents of file as a dict
         """
+        if self._json is None:
+            self._json = self._read()
         return self._json
 
     @json.setter
@@ -76,16 +295,377 @@ class IlluminaFile(object):
         if val is None:
             self._json = self._read()
 
-    def _read(self) -> str:
+    @property
+    def duplicates(self) -> List[Duplicate]:
+        """
+        Repeated keys, column names and section headers, in line order
+        """
+        return sorted(self._duplicates, key=lambda duplicate: duplicate.line)
+
+    def _duplicate(self, kind: str, section: str, name: str, line: int, first_line: int) -> None:
+        """
+        Records a repeated name, or raises `DuplicateKeyError` in strict mode
+        """
+        duplicate = Duplicate(kind, section, name, line, first_line)
+        if self._strict:
+            raise DuplicateKeyError([duplicate.label], [line])
+        self._duplicates[duplicate] = None
+
+    @staticmethod
+    def _source(source: Source):
+        """
+        Splits a file argument into a path and in-memory contents, one of
+        which is None. In-memory contents are kept as a bytes-like object
+        supporting `find()`, `count()` and slicing.
+        """
+        if isinstance(source, (str, os.PathLike)) and "\n" not in str(source):
+            return os.fspath(source), None
+        if hasattr(source, "read"):
+            source = source.read()
+        if isinstance(source, str):
+            return None, source.encode()
+        if isinstance(source, memoryview):
+            if source.c_contiguous and source.nbytes == len(source.obj) \
+                    and isinstance(source.obj, (bytes, bytearray)):
+                # a view of a whole bytes object; use that without copying
+                return None, source.obj
+            return None, source.tobytes()
+        return None, source
+
+    @contextmanager
+    def _buffer(self) -> Iterator[Union[bytes, bytearray, "mmap.mmap"]]:
+        """
+        Yields the raw contents of the file: the in-memory contents, or
+        the file on disk, memory-mapped when large
+        """
+        if self._data is not None:
+            yield self._data
+            return
+
+        with open(self.filename, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # empty files cannot be mapped
+            if mmap is None or size == 0 or size < MMAP_MIN_SIZE:
+                yield f.read()
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    yield data
+
+    def _skip_offset(self, data) -> int:
+        """
+        Byte offset of the first line after the `skip` lines
+        """
+        offset = 0
+        for i in range(self._skip):
+            end = data.find(b"\n", offset)
+            offset = len(data) if end == -1 else end + 1
+        return offset
+
+    @staticmethod
+    def _count_lines(data, start: int, end: int) -> int:
+        """
+        Number of line breaks in part of a buffer
+        """
+        if isinstance(data, (bytes, bytearray)):
+            return data.count(b"\n", start, end)
+        # memory maps have no count(); count in a copy of the part
+        return data[start:end].count(b"\n")
+
+    @staticmethod
+    def _decode(data, start: int, end: int) -> str:
+        """
+        Decodes part of a buffer without copying it first
+        """
+        with memoryview(data) as view:
+            return str(view[start:end], "utf-8")
+
+    @contextmanager
+    def _stream(self) -> Iterator[io.IOBase]:
+        """
+        Yields the file opened for reading line by line: the file-like
+        source, the in-memory contents or the file on disk
+        """
+        if self._file is not None:
+            yield self._file
+        elif self._data is not None:
+            yield io.BytesIO(self._data)
+        else:
+            with open(self.filename, "rb") as f:
+                yield f
+
+    def _stream_lines(self, f: io.IOBase, sections: Dict[str, SectionSpan]) -> Iterator[str]:
+        """
+        Reads the decoded lines of a file one at a time, enforcing the
+        parse limits, and records the span of each section in `sections`
+        as it is passed. A line is never read further than
+        `max_line_length`, so memory stays bounded whatever the input.
+        """
+        limits = self._limits
+        max_line = limits.max_line_length
+        # room for the line break, so a line at the limit is read whole
+        size = -1 if max_line is None else max_line + 2
+        delim = self._delim.encode()
+        offset = 0
+        line = 0
+        rows = 0
+        n_sections = 0
+        name = start = first_line = None
+
+        while True:
+            raw = f.readline(size)
+            if not raw:
+                break
+            if isinstance(raw, str):
+                raw = raw.encode()
+            line += 1
+            content = raw.rstrip(b"\r\n")
+            if limits.max_bytes is not None and offset + len(raw) > limits.max_bytes:
+                raise ParseLimitError("max_bytes", line, f"file is larger than {limits.max_bytes} bytes")
+            if max_line is not None and len(content) > max_line:
+                raise ParseLimitError("max_line_length", line, f"line is longer than {max_line} bytes")
+
+            if line <= self._skip:
+                pass
+            elif not content.strip(delim):
+                # a section break (e.g. the trailing rows of an Excel
+                # export) costs time, not memory; `max_bytes` bounds those
+                yield ""
+            else:
+                first_cell = content.split(delim, 1)[0]
+                if first_cell[:1] == b"[" and first_cell[-1:] == b"]":
+                    n_sections += 1
+                    if limits.max_sections is not None and n_sections > limits.max_sections:
+                        raise ParseLimitError("max_sections", line,
+                                              f"file has more than {limits.max_sections} sections")
+                    if name is not None:
+                        sections[name] = SectionSpan(start, offset - start, first_line, line - 1)
+                    name = first_cell[1:-1].decode()
+                    start, first_line, rows = offset, line, 0
+                rows += 1
+                if limits.max_rows is not None and rows > limits.max_rows:
+                    where = "before the first section" if name is None else f"in section [{name}]"
+                    raise ParseLimitError("max_rows", line, f"more than {limits.max_rows} rows {where}")
+                yield raw.decode()
+            offset += len(raw)
+
+        if name is not None:
+            sections[name] = SectionSpan(start, offset - start, first_line, line)
+
+    def _read_stream(self) -> JSONType:
+        """
+        Reads the contents of the file into a dict with the stream engine,
+        recording the section spans in `sections` as the lazy index does
+        """
+        sections = {}
+        with self._stream() as f:
+            rows = csv.reader(self._stream_lines(f, sections), delimiter=self._delim)
+            file_contents = self._tokenize(rows)
+        self.sections = sections
+        return file_contents
+
+    def _read(self) -> JSONType:
         """
         Reads the contents of the imported file into a dict
         """
-        with open(self.filename, "r") as f:
-            file_contents = {}
+        if self._engine == "stream":
+            return self._read_stream()
 
+        with self._buffer() as data:
             # some files have license/use info at the top. Skip these lines
-            if self._skip > 0:
-                [next(f) for i in range(self._skip)]
+            text = self._decode(data, self._skip_offset(data), len(data))
+
+        if self._engine == "python":
+            return self._read_python(text)
+
+        return self._tokenize(self._rows(text))
+
+    def _rows(self, text: str) -> Iterator[List[str]]:
+        """
+        Splits text into rows of cells
+        """
+        # quoted fields need the csv module; unquoted files (the common
+        # case) are split directly, which is the same C-level work
+        # without the dialect handling
+        if '"' in text:
+            return csv.reader(io.StringIO(text, newline=""), delimiter=self._delim)
+        # lines end at "\n" only, as they do for csv.reader and the stream
+        # engine; str.splitlines() would also break at e.g. \x85 or \x0c
+        lines = text.split("\n")
+        if not lines[-1]:
+            lines.pop()
+        if "\r" in text:
+            lines = [line[:-1] if line[-1:] == "\r" else line for line in lines]
+        return map(str.split, lines, repeat(self._delim))
+
+    def _index(self) -> Dict[str, SectionSpan]:
+        """
+        Scans the file for section headers without tokenizing it,
+        recording the byte offset and line span of each section
+        """
+        with self._buffer() as data:
+            return self._index_buffer(data)
+
+    def _index_buffer(self, data) -> Dict[str, SectionSpan]:
+        """
+        Section scan of `IlluminaFile._index()` over the raw file contents
+        """
+        base = self._skip_offset(data)
+        starts = [base] if data[base:base + 1] == b"[" else []
+        pos = data.find(b"\n[", base)
+        while pos != -1:
+            starts.append(pos + 1)
+            pos = data.find(b"\n[", pos + 1)
+
+        sections = {}
+        line = self._skip + 1
+        previous = base
+        for start, end in zip(starts, starts[1:] + [len(data)]):
+            line += self._count_lines(data, previous, start)
+            previous = start
+
+            line_end = data.find(b"\n", start, end)
+            first_cell = data[start:end if line_end == -1 else line_end]
+            first_cell = first_cell.decode().rstrip("\r").split(self._delim)[0]
+            if first_cell[-1:] != "]":
+                continue
+
+            n_lines = self._count_lines(data, start, end)
+            if data[end - 1:end] != b"\n":
+                n_lines += 1
+            name = first_cell[1:-1]
+            if name in sections:
+                self._duplicate("section", name, name, line, sections[name].first_line)
+            sections[name] = SectionSpan(
+                    start, end - start, line, line + n_lines - 1
+                    )
+
+        return sections
+
+    def _section(self, name: str) -> Any:
+        """
+        Returns the contents of a single section. Unless the whole file has
+        already been parsed, only the requested section is decoded and
+        tokenized; the result is memoized.
+        """
+        if self._json is not None:
+            return self._json[name]
+
+        if name not in self._loaded:
+            span = self.sections[name]
+            if self._data is not None:
+                text = self._decode(self._data, span.offset, span.offset + span.length)
+            else:
+                # read only the section's bytes, not the whole file
+                with open(self.filename, "rb") as f:
+                    f.seek(span.offset)
+                    text = f.read(span.length).decode()
+            self._loaded[name] = self._tokenize(self._rows(text), span.first_line)[name]
+
+        return self._loaded[name]
+
+    def _tokenize(self, rows: Iterator[List[str]], first_line: Optional[int] = None) -> JSONType:
+        """
+        Builds the file contents dict from already-tokenized rows in a
+        single pass. Rows made up entirely of empty cells are section
+        breaks and are skipped. Repeated keys, column names and section
+        headers are recorded as they are met; `first_line` is the line
+        number of the first row, by default the first line after `skip`.
+        """
+        file_contents = {}
+        section = None
+        data_type = None
+        # in the columns layout, padded rows are collected per section and
+        # transposed once the whole file has been read
+        tables = {}
+        # line of each section header, and of each key of the current
+        # record section, for reporting repeats
+        section_lines = {}
+        key_lines = {}
+        line = (self._skip + 1 if first_line is None else first_line) - 1
+
+        for row in rows:
+            line += 1
+            if not any(row):
+                continue
+
+            first = row[0]
+
+            # handle section header
+            # a header is always expected to be the first line of a section
+            if first[:1] == "[" and first[-1:] == "]":
+                header = first[1:-1]
+                if header in section_lines:
+                    self._duplicate("section", header, header, line, section_lines[header])
+                section_lines[header] = section_lines.get(header, line)
+
+                if header in self._tabular_sections:
+                    # section head followed by column names. Consume the
+                    # next row here; the rest of the section is tabular data
+                    column_names = next(rows, [])
+                    line += 1
+                    n_columns = len(column_names)
+                    if len(set(column_names)) < n_columns:
+                        self._duplicate_columns(header, column_names, line)
+                    section = file_contents[header] = []
+                    data_type = "tabular"
+                    if self._columnar:
+                        tables[header] = column_names
+                elif header in self._array_sections:
+                    section = file_contents[header] = []
+                    data_type = "array"
+                else:
+                    section = file_contents[header] = {}
+                    data_type = "record"
+                    key_lines = {}
+
+            # handle section data
+            elif data_type == "tabular":
+                if len(row) < n_columns:
+                    row += ["NA"] * (n_columns - len(row))
+                if self._columnar:
+                    section.append(row)
+                else:
+                    section.append(dict(zip(column_names, row)))
+
+            elif data_type == "array":
+                section.append(first)
+
+            elif data_type == "record":
+                if first in key_lines:
+                    self._duplicate("key", header, first, line, key_lines[first])
+                else:
+                    key_lines[first] = line
+                section[first] = row[1] if len(row) > 1 else ""
+
+            else:
+                raise ValueError(
+                    f"Data found before the first section header: {first}"
+                )
+
+        for header, column_names in tables.items():
+            file_contents[header] = Table(column_names, file_contents[header])
+
+        return file_contents
+
+    def _duplicate_columns(self, section: str, column_names: List[str], line: int) -> None:
+        """
+        Records the repeated names in a tabular section's column names.
+        Empty names, as left by rows padded with trailing delimiters, are
+        not names and never repeat.
+        """
+        seen = set()
+        for name in column_names:
+            if name in seen and name:
+                self._duplicate("column", section, name, line, line)
+            seen.add(name)
+
+    def _read_python(self, text: str) -> JSONType:
+        """
+        Reads the contents of the imported file into a dict, line by line.
+        This is the original parser; it does not handle quoted fields.
+        """
+        with io.StringIO(text, newline=None) as f:
+            file_contents = {}
 
             for line in f:
                 line = line.rstrip("\n")
@@ -162,19 +742,18 @@ class IndexSheet(IlluminaFile):
         settings: various program-specific settings
         data: index data
     """
-    def __init__(self, filename):
+    def __init__(self, filename, lazy: bool = False, layout: str = "records", strict: bool = False):
         super().__init__(
                 filename,
                 delim=",",
                 # TSO customized setting tag
                 tabular_sections=["Data"],
                 array_sections=[],
-                skip=0)
-        self.header = None
-        self.reads = None
-        self.settings = None
+                skip=0,
+                lazy=lazy,
+                layout=layout,
+                strict=strict)
         self.site = None
-        self.data = None
         self.bclconvert_settings = None
         self.bclconvert_data = None
 
@@ -183,51 +762,31 @@ class IndexSheet(IlluminaFile):
         """
         Returns samplesheet header
         """
-        return self._header
-
-    @header.setter
-    def header(self, val):
-        if val is None:
-            self._header = self.json["Header"]
+        return self._section("Header")
 
     @property
     def reads(self) -> dict:
         """
         Returns read lengths
         """
-        return self._reads
+        return self._section("Reads")
 
-    @reads.setter
-    def reads(self, val):
-        if val is None:
-            self._reads = self.json["Reads"]
-            
     @property
     def settings(self) -> dict:
         """
         Returns analysis settings
         """
-        return self._settings
-
-    @settings.setter
-    def settings(self, val):
-        if val is None:
-            # TSO customized setting tag
-            self._settings = self.json["Settings"]
+        # TSO customized setting tag
+        return self._section("Settings")
 
     @property
     def data(self) -> JSONType:
         """
         Returns samplesheet data
         """
-        return self._data
+        # TSO customized setting tag
+        return self._section("Data")
 
-    @data.setter
-    def data(self, val):
-        if val is None:
-            # TSO customized setting tag
-            self._data = self.json["Data"]                
-            
 class SampleSheet(IlluminaFile):
     """
     Class for parsing TSO500-specific `*_SampleSheet.csv` files.
@@ -240,6 +799,22 @@ class SampleSheet(IlluminaFile):
         >>> samplesheet = SampleSheet("SampleSheet.csv")
         >>> samplesheet.header
 
+    Pass `lazy=True` to parse each section only when it is first accessed,
+    e.g. when only the header is needed:
+
+        >>> SampleSheet("SampleSheet.csv", lazy=True).header["RunName"]
+
+    Pass `layout="columns"` to store the tabular sections as `Table`s.
+
+    Repeated keys, column names and section headers are listed, with
+    their line numbers, in `duplicates`; pass `strict=True` to raise a
+    `DuplicateKeyError` at the first one instead.
+
+    Pass `limits` to parse an untrusted file with the stream engine, which
+    stops with a `ParseLimitError` at the first line exceeding them:
+
+        >>> SampleSheet(upload.content, layout="columns", limits=ParseLimits())
+
     Attributes:
         filename: path to file
         header: samplesheet header (i.e. analysis metadata)
@@ -250,140 +825,110 @@ class SampleSheet(IlluminaFile):
         bclconvert_settings: bclconvert settings
         bclconvert_data: bclconvert data
     """
-    def __init__(self, filename):
+    def __init__(self,
+                 filename,
+                 lazy: bool = False,
+                 layout: str = "records",
+                 strict: bool = False,
+                 limits: Optional[ParseLimits] = None):
         super().__init__(
                 filename,
                 delim=",",
                 # TSO customized setting tag
                 tabular_sections=["TSO500S_Data", "BCLConvert_Data"],
                 array_sections=[],
-                skip=0)
-        self.header = None
-        self.reads = None
-        self.settings = None
-        self.site = None
-        self.data = None
-        self.bclconvert_settings = None
-        self.bclconvert_data = None
+                skip=0,
+                engine="csv" if limits is None else "stream",
+                lazy=lazy,
+                layout=layout,
+                strict=strict,
+                limits=limits)
 
     @property
     def header(self) -> dict:
         """
         Returns samplesheet header
         """
-        return self._header
-
-    @header.setter
-    def header(self, val):
-        if val is None:
-            self._header = self.json["Header"]
+        return self._section("Header")
 
     @property
     def reads(self) -> dict:
         """
         Returns read lengths
         """
-        return self._reads
-
-    @reads.setter
-    def reads(self, val):
-        if val is None:
-            self._reads = self.json["Reads"]
+        return self._section("Reads")
 
     @property
     def settings(self) -> dict:
         """
         Returns analysis settings
         """
-        return self._settings
+        # TSO customized setting tag
+        return self._section("TSO500S_Settings")
 
-    @settings.setter
-    def settings(self, val):
-        if val is None:
-            # TSO customized setting tag
-            self._settings = self.json["TSO500S_Settings"]
-    
     @property
     def site(self) -> dict:
         """
         Returns site info
         """
-        return self._site
-    
-    @site.setter
-    def site(self, val):
-        if val is None:
-            self._site = self.json["NSWHP"]
+        return self._section("NSWHP")
 
     @property
     def data(self) -> JSONType:
         """
         Returns samplesheet data
         """
-        return self._data
+        # TSO customized setting tag
+        return self._section("TSO500S_Data")
 
-    @data.setter
-    def data(self, val):
-        if val is None:
-            # TSO customized setting tag
-            self._data = self.json["TSO500S_Data"]
-            
     @property
     def bclconvert_settings(self) -> JSONType:
         """
         Returns bclconvert_settings data
         """
-        return self._bclconvert_settings
-    
-    @bclconvert_settings.setter
-    def bclconvert_settings(self, val):
-        if val is None:
-            # TSO customized setting tag
-            self._bclconvert_settings = self.json["BCLConvert_Settings"]
+        # TSO customized setting tag
+        return self._section("BCLConvert_Settings")
 
     @property
     def bclconvert_data(self) -> JSONType:
         """
         Returns bclconvert data
         """
-        return self._bclconvert_data
+        # TSO customized setting tag
+        return self._section("BCLConvert_Data")
 
-    @bclconvert_data.setter
-    def bclconvert_data(self, val):
-        if val is None:
-            # TSO customized setting tag
-            self._bclconvert_data = self.json["BCLConvert_Data"]
-    
-def find_duplicate_keys(record: Dict[str, Dict]) -> List:
+
+def find_duplicate_keys(record: List[Dict[str, Any]]) -> List:
     """
-    finds duplicated keys in a dict of dicts
+    finds duplicated keys in a list of dicts, in linear time
     """
-    all_keys = reduce(lambda x, y: x + list(y.keys()), record, [])
-    key_counts = Counter(all_keys)
-    duplicate_keys = list(filter(lambda x: key_counts[x] > 1, key_counts))
-    return duplicate_keys
+    key_counts = Counter(chain.from_iterable(record))
+    return [key for key, count in key_counts.items() if count > 1]
 
 
 def flatten_record(record: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
-    Flattens list of dicts to single dict
+    Flattens list of dicts to single dict in one pass
 
     Args:
         record: List of dicts
 
     Returns:
         a single, flattened dict
-    """
-    duplicate_keys = find_duplicate_keys(record)
 
-    if len(duplicate_keys) > 0:
-        raise DuplicateKeyError(duplicate_keys)
-
-    chain_map = ChainMap(*record)
-    return dict(chain_map)
+    Raises:
+        DuplicateKeyError: a key appears in more than one dict
+    """
+    flattened = {}
+    for part in record:
+        n_keys = len(flattened)
+        flattened.update(part)
+        if len(flattened) < n_keys + len(part):
+            raise DuplicateKeyError(find_duplicate_keys(record))
+    return flattened
 
 
-def parse_samplesheet_data(filepath: str) -> pd.DataFrame:
+def parse_samplesheet_data(filepath: str) -> "pd.DataFrame":
     """
     Parses the TSO500 `*SampleSheet.csv` file, returning the contents
     of the *[Data]* section (i.e., the sample data) as a `pd.DataFrame` object.
@@ -394,10 +939,10 @@ def parse_samplesheet_data(filepath: str) -> pd.DataFrame:
     Returns:
         Contents of *[Data]* section as a `pd.DataFrame` object
     """
-    samplesheet = SampleSheet(filepath).data
-    return pd.DataFrame(samplesheet)
+    samplesheet = SampleSheet(filepath, lazy=True, layout="columns").data
+    return samplesheet.to_dataframe()
 
-def parse_index_data(filepath: str) -> pd.DataFrame:
+def parse_index_data(filepath: str) -> "pd.DataFrame":
     """
     Parses the TSO500 index `TSO-novaseq-UDP_v1.5_chemistry.csv` file, 
     returning the contents
@@ -409,5 +954,5 @@ def parse_index_data(filepath: str) -> pd.DataFrame:
     Returns:
         Contents of *[Data]* section as a `pd.DataFrame` object
     """
-    indexsheet = IndexSheet(filepath).data
-    return pd.DataFrame(indexsheet)
\ No newline at end of file
+    indexsheet = IndexSheet(filepath, lazy=True, layout="columns").data
+    return indexsheet.to_dataframe()
\ No newline at end of file
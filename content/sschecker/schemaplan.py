@@ -0,0 +1,161 @@
+"""
+Compiled validation plans for the schema pattern dicts in `schema.py`
+"""
+from functools import partial
+import hashlib
+import json
+import operator
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+class SchemaPlan(object):
+    """
+    Validator compiled once from a schema pattern dict, so that the
+    patterns are not re-interpreted for every field of every sheet.
+
+    Literal fields become equality checks, regex fields become
+    precompiled full-match callables and the expected fields become a
+    frozenset for the missing-key check. Plans are normally obtained
+    through `compile_schema()`, which caches one plan per schema dict.
+
+    Basic usage:
+
+        >>> from schema import header_patterns
+        >>> plan = compile_schema(header_patterns)
+        >>> plan.validate(samplesheet.header)
+
+    Attributes:
+        patterns: schema pattern dict the plan was compiled from
+        required: fields the schema expects
+    """
+    def __init__(self, patterns: Dict[str, Any]) -> None:
+        self.patterns = patterns
+        self.required = frozenset(patterns)
+        self._checks = {
+            field: self._compile_field(pattern) for field, pattern in patterns.items()
+        }
+        self._column_checks = {
+            field: self._compile_column(pattern) for field, pattern in patterns.items()
+        }
+
+    @staticmethod
+    def _compile_field(pattern: Any) -> Callable[[Any], bool]:
+        """
+        Returns a callable checking a single value against `pattern`
+        """
+        if isinstance(pattern, str):
+            return partial(operator.eq, pattern)
+        elif isinstance(pattern, re.Pattern):
+            fullmatch = pattern.fullmatch
+            return lambda value: isinstance(value, str) and fullmatch(value) is not None
+        else:
+            return lambda value: False
+
+    @staticmethod
+    def _compile_column(pattern: Any) -> Optional[re.Pattern]:
+        """
+        Builds a regex that fully matches a whole column of values joined
+        by newlines, each of which fully matches `pattern`. Returns None
+        when the pattern is not of the form `^...$` or could itself match
+        a newline, in which case values are checked one at a time.
+        """
+        if not isinstance(pattern, re.Pattern):
+            return None
+        source = pattern.pattern
+        if not (source.startswith("^") and source.endswith("$")) or source.endswith("\\$"):
+            return None
+        body = source[1:-1]
+        if re.search(r"[.^$]|\\[sSWDnZAbB1-9]|\(\?[a-zA-Z]*s", body):
+            return None
+        return re.compile(f"(?:{body})(?:\n(?:{body}))*", pattern.flags)
+
+    def check(self, field: str, value: Any) -> bool:
+        """
+        Checks a single value; fields without a pattern are always valid
+        """
+        check = self._checks.get(field)
+        if check is None:
+            return True
+        return check(value)
+
+    def validate(self, data: Dict[str, Any]) -> Dict[str, List]:
+        """
+        Validates a record section (a dict of field to value)
+
+        Returns:
+            dict of `missing_keys`, `valid_keys` and `invalid_keys`
+        """
+        valid_keys = []
+        invalid_keys = []
+        for field, check in self._checks.items():
+            if field in data:
+                if check(data[field]):
+                    valid_keys.append(field)
+                else:
+                    invalid_keys.append(field)
+
+        return {
+            "missing_keys": list(self.required.difference(data.keys())),
+            "valid_keys": valid_keys,
+            "invalid_keys": invalid_keys
+        }
+
+    def column_failures(self, field: str, values: Sequence[Any]) -> List[bool]:
+        """
+        Checks a whole column in one batch, returning a list that is True
+        for each failing value.
+
+        Literals are compared through `map`. For regexes the column is
+        first checked with one anchored full match over all of its values;
+        only a column that fails is checked value by value. Non-string
+        (i.e. missing) values always fail.
+        """
+        pattern = self.patterns.get(field)
+        if pattern is None:
+            return [False] * len(values)
+        if isinstance(pattern, str):
+            return list(map(partial(operator.ne, pattern), values))
+
+        whole_column = self._column_checks[field]
+        if whole_column is not None:
+            try:
+                joined = "\n".join(values)
+            except TypeError:
+                # missing values; fall through to the per-value check
+                joined = None
+            if joined is not None and joined.count("\n") == len(values) - 1 \
+                    and whole_column.fullmatch(joined):
+                return [False] * len(values)
+
+        check = self._checks[field]
+        return [not check(value) for value in values]
+
+
+_plans: Dict[int, SchemaPlan] = {}
+
+
+def compile_schema(patterns: Dict[str, Any]) -> SchemaPlan:
+    """
+    Returns the compiled plan for a schema pattern dict, compiling it on
+    first use. Plans are cached for the life of the process, so schema
+    dicts should not be modified after they have been compiled.
+    """
+    plan = _plans.get(id(patterns))
+    if plan is None or plan.patterns is not patterns:
+        plan = _plans[id(patterns)] = SchemaPlan(patterns)
+    return plan
+
+
+def schema_digest(schemas: Sequence[Dict[str, Any]]) -> str:
+    """
+    Returns a sha256 of the fields and patterns of schema pattern dicts,
+    in order. It changes whenever a field or pattern in `schema.py`
+    changes, e.g. to tell results checked against another schema apart.
+    """
+    canonical = [
+        [[field, [pattern.pattern, pattern.flags] if isinstance(pattern, re.Pattern) else repr(pattern)]
+         for field, pattern in patterns.items()]
+        for patterns in schemas
+    ]
+    return hashlib.sha256(json.dumps(canonical).encode()).hexdigest()
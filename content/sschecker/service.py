@@ -0,0 +1,436 @@
+"""
+Local HTTP validation service
+
+A small HTTP/1.1 server built on `asyncio` streams, so it needs nothing
+beyond the standard library. Uploads are read from the connection in
+chunks as they arrive; each sheet is then checked on a bounded process
+pool whose workers keep a warm `Checker` (compiled schema, loaded UDP
+registries and a `ResultCache` of recent results), and the
+`ValidationResult` is returned as JSON. Uploads are parsed with the
+stream engine under the default `ParseLimits`, so a malformed upload
+fails fast instead of tying up a worker.
+
+Endpoints:
+
+    POST /check[?name=SampleSheet.csv&mode=skip]   samplesheet as the body
+    GET  /health                                   pool size and load
+    GET  /metrics                                  request counts and latencies
+
+Basic usage:
+
+    python service.py --port 8500 --jobs 4
+    curl --data-binary @SampleSheet.csv "http://127.0.0.1:8500/check?name=SampleSheet.csv"
+
+The service is not part of the notebook; Pyodide has no sockets or
+processes.
+"""
+import argparse
+import asyncio
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+from checker import Checker
+from resultcache import ResultCache
+from results import Issue, ValidationResult
+from samplesheetparser import ParseLimits
+from validation import DEFAULT_UDP
+
+MODES = ("default", "skip")
+
+# bytes read from the connection at a time
+CHUNK_SIZE = 64 * 1024
+
+# checker of a service worker process, created once per process by `_warm_up()`
+_worker_checker = None
+
+
+def _warm_up(udp: Union[str, Sequence[str]], mode: str, cache_dir: Optional[str], limits: ParseLimits) -> None:
+    global _worker_checker
+    _worker_checker = Checker(udp, mode, ResultCache(cache_dir=cache_dir), limits)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def check_upload(content: bytes, name: str, mode: Optional[str] = None) -> Tuple[Dict[str, Any], float]:
+    """
+    Validates an uploaded samplesheet with the worker's checker
+
+    Returns:
+        the result as a dict, and the seconds spent checking
+    """
+    start = time.perf_counter()
+    try:
+        result = _worker_checker.check(content, name=name, mode=mode)
+    except Exception as e:
+        # e.g. a sheet that is not text
+        result = ValidationResult(name)
+        result.issues.append(Issue("", "stage_error", f"{type(e).__name__}: {e}"))
+    return result.to_dict(), time.perf_counter() - start
+
+
+class HttpError(Exception):
+    """
+    Ends a request with an error status and a JSON message
+    """
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ServiceMetrics(object):
+    """
+    Request counts and the latencies of the most recent requests
+
+    Attributes:
+        started: time the service started, from `time.time()`
+        requests: count of finished requests per endpoint
+        statuses: count of responses per HTTP status
+        verdicts: count of `valid` and `invalid` checks
+        in_flight: requests being handled
+        window: number of recent requests latencies are computed over
+    """
+    def __init__(self, window: int = 1024) -> None:
+        self.started = time.time()
+        self.requests: Counter = Counter()
+        self.statuses: Counter = Counter()
+        self.verdicts: Counter = Counter()
+        self.in_flight = 0
+        self.window = window
+        self._latencies: Dict[str, deque] = {
+            "total": deque(maxlen=window),
+            "queue": deque(maxlen=window),
+            "check": deque(maxlen=window),
+        }
+
+    def record(self, path: str, status: int, seconds: float) -> None:
+        self.requests[path] += 1
+        self.statuses[status] += 1
+        if path == "/check":
+            self._latencies["total"].append(seconds)
+
+    def record_check(self, verdict: str, queue: float, check: float) -> None:
+        self.verdicts[verdict] += 1
+        self._latencies["queue"].append(queue)
+        self._latencies["check"].append(check)
+
+    @staticmethod
+    def summary(latencies: Sequence[float]) -> Dict[str, Optional[float]]:
+        """
+        Returns the count, mean, median, 95th percentile and maximum of
+        `latencies`, in milliseconds
+        """
+        if not latencies:
+            return {"count": 0, "mean_ms": None, "p50_ms": None, "p95_ms": None, "max_ms": None}
+        ordered = sorted(latencies)
+        return {
+            "count": len(ordered),
+            "mean_ms": sum(ordered) / len(ordered) * 1e3,
+            "p50_ms": ordered[len(ordered) // 2] * 1e3,
+            "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1e3,
+            "max_ms": ordered[-1] * 1e3,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "uptime": time.time() - self.started,
+            "in_flight": self.in_flight,
+            "requests": dict(self.requests),
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "verdicts": dict(self.verdicts),
+            "latency": {name: self.summary(latencies) for name, latencies in self._latencies.items()},
+        }
+
+
+class ValidationService(object):
+    """
+    Serves samplesheet checks over HTTP on a pool of warm worker
+    processes. At most `jobs` sheets are checked at once and `backlog`
+    more wait for a worker; requests beyond that are refused with 503
+    rather than queued without bound.
+
+    Basic usage:
+
+        >>> service = ValidationService(jobs=4)
+        >>> asyncio.run(service.serve("127.0.0.1", 8500))
+
+    Attributes:
+        udp: UDP registry file, or a list of them (one per kit)
+        mode: sample index selection mode used when a request gives none
+        jobs: number of worker processes
+        backlog: number of checks that may wait for a worker
+        max_upload: largest accepted samplesheet, in bytes
+        cache_dir: directory of the result cache shared by the workers;
+            None keeps a separate in-memory cache per worker
+        metrics: the `ServiceMetrics` of this service
+    """
+    def __init__(self,
+                 udp: Union[str, Sequence[str]] = DEFAULT_UDP,
+                 mode: str = "default",
+                 jobs: Optional[int] = None,
+                 backlog: Optional[int] = None,
+                 max_upload: int = 16 * 1024 * 1024,
+                 cache_dir: Optional[str] = None) -> None:
+        self.udp = udp
+        self.mode = mode
+        self.jobs = jobs or os.cpu_count() or 1
+        self.backlog = self.jobs * 4 if backlog is None else backlog
+        self.max_upload = max_upload
+        self.cache_dir = cache_dir
+        self.metrics = ServiceMetrics()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending = 0
+
+    async def start(self) -> None:
+        """
+        Starts the worker processes and waits until they are warm, so the
+        first requests do not pay for loading the registries
+        """
+        loop = asyncio.get_running_loop()
+        self._pool = ProcessPoolExecutor(max_workers=self.jobs, initializer=_warm_up,
+                                         initargs=(self.udp, self.mode, self.cache_dir,
+                                                   ParseLimits(max_bytes=self.max_upload)))
+        self._slots = asyncio.Semaphore(self.jobs)
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _ping) for _ in range(self.jobs)))
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8500,
+                    ready: Optional[asyncio.Future] = None) -> None:
+        """
+        Serves until cancelled. `ready`, when given, is set to the bound
+        (host, port) once the service accepts connections, e.g. to learn
+        the port picked for `port=0`.
+        """
+        await self.start()
+        server = await asyncio.start_server(self.handle, host, port, limit=CHUNK_SIZE)
+        try:
+            address = server.sockets[0].getsockname()[:2]
+            if ready is not None:
+                ready.set_result(address)
+            else:
+                print(f"Serving samplesheet checks on http://{address[0]}:{address[1]}"
+                      f" with {self.jobs} workers, press Ctrl+C to stop")
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Handles the requests of one connection, keeping it open between
+        requests unless the client asks to close it
+        """
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.respond(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                                       {"error": "request head too large"}, close=True)
+                    break
+                start = time.perf_counter()
+                self.metrics.in_flight += 1
+                path = "?"
+                try:
+                    method, target, version, headers = self.parse_head(head)
+                    path = urlsplit(target).path
+                    keep_alive = (headers.get("connection", "").lower() != "close"
+                                  and version == "HTTP/1.1")
+                    status, body = await self.dispatch(method, target, headers, reader)
+                except HttpError as e:
+                    status, body, keep_alive = e.status, {"error": e.message}, False
+                except ConnectionError:
+                    raise
+                except Exception as e:
+                    # e.g. a broken worker pool; answered and counted like
+                    # any other failed request
+                    status, body, keep_alive = (HTTPStatus.INTERNAL_SERVER_ERROR,
+                                                {"error": f"{type(e).__name__}: {e}"}, False)
+                finally:
+                    self.metrics.in_flight -= 1
+                seconds = time.perf_counter() - start
+                self.metrics.record(path, status, seconds)
+                await self.respond(writer, status, body, close=not keep_alive, seconds=seconds)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def parse_head(head: bytes) -> Tuple[str, str, str, Dict[str, str]]:
+        """
+        Splits a request head into method, target, HTTP version and
+        headers (with lower-case names)
+        """
+        try:
+            request_line, *lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+            method, target, version = request_line.split(" ")
+            headers = {}
+            for line in lines:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "malformed request")
+        return method, target, version, headers
+
+    async def dispatch(self, method: str, target: str, headers: Dict[str, str],
+                       reader: asyncio.StreamReader) -> Tuple[int, Dict[str, Any]]:
+        url = urlsplit(target)
+        if url.path == "/check":
+            if method != "POST":
+                raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, "use POST with the samplesheet as the body")
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            content = await self.read_body(headers, reader)
+            return HTTPStatus.OK, await self.check(content, query.get("name", "<samplesheet>"), query.get("mode"))
+        if method != "GET":
+            raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, f"use GET for {url.path}")
+        if url.path == "/health":
+            return HTTPStatus.OK, {"status": "ok", "workers": self.jobs, "pending": self._pending,
+                                   "backlog": self.backlog}
+        if url.path == "/metrics":
+            return HTTPStatus.OK, self.metrics.to_dict()
+        raise HttpError(HTTPStatus.NOT_FOUND, f"no such endpoint: {url.path}")
+
+    async def read_body(self, headers: Dict[str, str], reader: asyncio.StreamReader) -> bytes:
+        """
+        Reads a request body sent with a Content-Length or chunked, a
+        chunk at a time, refusing bodies larger than `max_upload`
+        """
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            try:
+                return await self.read_chunks(reader)
+            except asyncio.IncompleteReadError:
+                raise HttpError(HTTPStatus.BAD_REQUEST, "connection closed before the end of the body")
+            except ValueError:
+                # a chunk size line over the stream limit, or not hexadecimal
+                raise HttpError(HTTPStatus.BAD_REQUEST, "malformed chunk")
+
+        body = bytearray()
+        try:
+            length = int(headers["content-length"])
+        except (KeyError, ValueError):
+            raise HttpError(HTTPStatus.LENGTH_REQUIRED, "send a Content-Length or a chunked body")
+        if length > self.max_upload:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"samplesheets are limited to {self.max_upload} bytes")
+        while len(body) < length:
+            chunk = await reader.read(min(CHUNK_SIZE, length - len(body)))
+            if not chunk:
+                raise HttpError(HTTPStatus.BAD_REQUEST, "connection closed before the end of the body")
+            body += chunk
+        return bytes(body)
+
+    async def read_chunks(self, reader: asyncio.StreamReader) -> bytes:
+        """
+        Reads a chunked request body
+        """
+        body = bytearray()
+        while True:
+            size_line = await reader.readline()
+            if not size_line.endswith(b"\n"):
+                raise asyncio.IncompleteReadError(size_line, None)
+            size = int(size_line.split(b";", 1)[0], 16)
+            if size == 0:
+                # trailers end with an empty line
+                while True:
+                    trailer = await reader.readline()
+                    if not trailer.endswith(b"\n"):
+                        raise asyncio.IncompleteReadError(trailer, None)
+                    if not trailer.strip():
+                        return bytes(body)
+            if len(body) + size > self.max_upload:
+                raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                f"samplesheets are limited to {self.max_upload} bytes")
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+
+    async def check(self, content: bytes, name: str, mode: Optional[str]) -> Dict[str, Any]:
+        """
+        Checks a samplesheet on the worker pool, waiting for a free worker
+        if all are busy
+
+        Returns:
+            the result as a dict, with the time spent waiting for a worker
+            and checking
+        """
+        if mode is not None and mode not in MODES:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"mode must be one of {', '.join(MODES)}")
+        if self._pending >= self.jobs + self.backlog:
+            raise HttpError(HTTPStatus.SERVICE_UNAVAILABLE, "too many samplesheets waiting, retry later")
+        self._pending += 1
+        start = time.perf_counter()
+        try:
+            async with self._slots:
+                queued = time.perf_counter() - start
+                result, check = await asyncio.get_running_loop().run_in_executor(
+                        self._pool, check_upload, content, name, mode)
+        finally:
+            self._pending -= 1
+        self.metrics.record_check(result["verdict"], queued, check)
+        result["timing"] = {"queue_ms": queued * 1e3, "check_ms": check * 1e3,
+                            "worker_ms": (time.perf_counter() - start - queued) * 1e3}
+        return result
+
+    @staticmethod
+    async def respond(writer: asyncio.StreamWriter, status: int, body: Dict[str, Any],
+                      close: bool = False, seconds: Optional[float] = None) -> None:
+        content = json.dumps(body).encode()
+        status = HTTPStatus(status)
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(content)}",
+            f"Connection: {'close' if close else 'keep-alive'}",
+        ]
+        if seconds is not None:
+            lines.append(f"Server-Timing: total;dur={seconds * 1e3:.3f}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + content)
+        await writer.drain()
+
+
+def parse_arguments(arguments: Optional[List[str]] = None) -> argparse.Namespace:
+    argsparser = argparse.ArgumentParser(description="Serves samplesheet checks over HTTP")
+    argsparser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    argsparser.add_argument("--port", type=int, default=8500, help="port to listen on (0 picks a free one)")
+    argsparser.add_argument(
+            "-u", "--udp", nargs="+", default=DEFAULT_UDP,
+            help="udp tag registry file; given several (e.g. one per kit), each samplesheet is checked"
+                 " against the kit that best fits its indexes"
+    )
+    argsparser.add_argument("-m", "--mode", default="default", choices=MODES, help="sample index selection mode")
+    argsparser.add_argument("-j", "--jobs", type=int, default=None,
+                            help="number of worker processes (default: one per CPU)")
+    argsparser.add_argument("--backlog", type=int, default=None,
+                            help="checks that may wait for a worker before requests are refused"
+                                 " (default: four per worker)")
+    argsparser.add_argument("--max-upload", type=int, default=16 * 1024 * 1024,
+                            help="largest accepted samplesheet in bytes")
+    argsparser.add_argument("--cache-dir", default=None,
+                            help="directory of a result cache shared by the workers (default: in memory only)")
+    return argsparser.parse_args(arguments)
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+    service = ValidationService(args.udp, args.mode, args.jobs, args.backlog, args.max_upload, args.cache_dir)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
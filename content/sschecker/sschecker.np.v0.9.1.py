@@ -2,29 +2,65 @@
 Samplesheet Checking Tools for custom Dragen TSO500 Solid Tumor Panel
 """
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+import glob
+import json
 import os
+from itertools import compress
+import sys
+from typing import List, Union
 
-import pandas as pd
-import re
-
-import samplesheetparser as parser
+from exceptions import InvalidSampleSheetError, ParseLimitError
 
+from checker import Checker
 from schema import header_patterns, reads_patterns, settings_patterns, site_patterns, bclconvert_settings_patterns
 from schema import data_patterns, bclconvert_data_patterns
+from profiling import Profiler
+from reporting import QUIET, SINKS, VERBOSE, NullSink, Reporter
+from resultcache import ResultCache
+from results import Issue, ValidationResult
+from schemaplan import compile_schema
+from udpregistry import CACHE_DIR
+from validation import STAGES, merge_issues, run_stage
+from watch import SampleSheetWatcher
+
+# checker of a batch worker process, created once per process by `warm_up()`
+worker_checker = None
 
-import __main__
+# schema patterns of the stages validating a section, listed at -vv when
+# the stage fails
+STAGE_PATTERNS = {
+    "Header": header_patterns,
+    "Reads": reads_patterns,
+    "Settings": settings_patterns,
+    "Site": site_patterns,
+    "Data": data_patterns,
+    "BCLConvert Settings": bclconvert_settings_patterns,
+    "BCLConvert Data": bclconvert_data_patterns,
+}
 
 def parse_arguments():
 
     argsparser = argparse.ArgumentParser()
 
-    argsparser.add_argument(
-            "-s", "--samplesheet", required=True,
+    inputs = argsparser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument(
+            "-s", "--samplesheet",
             help="samplesheet"
     )
+    inputs.add_argument(
+            "-b", "--batch",
+            help="directory or glob of samplesheets to validate in batch"
+    )
+    inputs.add_argument(
+            "-w", "--watch",
+            help="run folder to watch for new or modified *SampleSheet*.csv files"
+    )
     argsparser.add_argument(
-            "-u", "--udp", default="TSO-novaseq-UDP_v1.5_chemistry.csv",
-            help="udp tag registry file"
+            "-u", "--udp", nargs="+", default="TSO-novaseq-UDP_v1.5_chemistry.csv",
+            help="udp tag registry file; given several (e.g. one per kit), each samplesheet is checked"
+                 " against the kit that best fits its indexes"
     )
     argsparser.add_argument(
             "-m", "--mode", default="default",
@@ -34,278 +70,313 @@ def parse_arguments():
             "-o", "--output", default="report",
             help="directory to store report"
     )
+    argsparser.add_argument(
+            "-a", "--all", action="store_true",
+            help="run every check to completion and write a JSON report to --output"
+    )
+    argsparser.add_argument(
+            "-j", "--jobs", type=int, default=None,
+            help="number of batch worker processes (default: one per CPU)"
+    )
+    argsparser.add_argument(
+            "-i", "--interval", type=float, default=1.0,
+            help="watch mode polling interval in seconds"
+    )
+    argsparser.add_argument(
+            "-p", "--profile", action="store_true",
+            help="time each stage, print a timing table and write a JSON trace to --output"
+    )
+    argsparser.add_argument(
+            "--memory", action="store_true",
+            help="with --profile, also measure the peak memory of each stage, in a second, traced run"
+    )
+    argsparser.add_argument(
+            "--cprofile", action="store_true",
+            help="with --profile, also dump cProfile statistics of the slowest stage to --output"
+    )
+    argsparser.add_argument(
+            "-c", "--cache", nargs="?", const=CACHE_DIR, default=None,
+            help="with --all or --batch, reuse results of samplesheets checked before, cached on disk"
+                 f" (default directory: {CACHE_DIR})"
+    )
+    argsparser.add_argument(
+            "-v", "--verbose", action="count", default=QUIET,
+            help="report passed checks (-v) and the schema patterns (-vv), not only failures and the verdict"
+    )
+    argsparser.add_argument(
+            "-f", "--format", choices=list(SINKS), default="text",
+            help="output format"
+    )
 
     args = argsparser.parse_args()
 
     return args
 
-def main(samplesheet:str, udp:str, mode:str):
-    samplesheet = parser.SampleSheet(samplesheet)
-    
-    samplesheet_data = pd.DataFrame(samplesheet.data)
-    bcl_data = pd.DataFrame(samplesheet.bclconvert_data)
-        
-    ## Validate Header
-    print("===============================================================")
-    print("Validating Header")
-    print("===============================================================")
-    missing_keys, _, invalid_keys = validate_dict(samplesheet.header, header_patterns).values()
-    if len(missing_keys) > 0:
-        raise Exception (f"Missing keys: {missing_keys}")
-    elif len(invalid_keys) > 0:
-        raise Exception (f"Invalid keys: {invalid_keys}")
-    else:
-        print(">> Header is valid")
-        
-    print("===============================================================")
-    print("Validating Reads")
-    print("===============================================================")
-    missing_keys, _, invalid_keys = validate_dict(samplesheet.reads, reads_patterns).values()
-    if len(missing_keys) > 0:
-        raise Exception (f"Missing keys: {missing_keys}")
-    elif len(invalid_keys) > 0:
-        print (f"Valid Entry has a format of:")
-        print ('---------------------------------------------------------------')
-        for entry, value in reads_patterns.items():
-            print (f"{entry}: {value}")
-            print ('---------------------------------------------------------------')
-        raise Exception (f"Invalid Entry: {invalid_keys}")
-    else:
-        print(">> Reads are valid")
-    
-    print("===============================================================")
-    print("Validating Settings")
-    print("===============================================================")
-    missing_keys, _, invalid_keys = validate_dict(samplesheet.settings, settings_patterns).values()
-    if len(missing_keys) > 0:
-        raise Exception (f"Missing keys: {missing_keys}")
-    elif len(invalid_keys) > 0:
-        print (f"Valid Entry has a format of:")
-        print ('---------------------------------------------------------------')
-        for entry, value in settings_patterns.items():
-            print (f"{entry}: {value}")
-            print ('---------------------------------------------------------------')
-        raise Exception (f"Invalid Entry: {invalid_keys}")
-    else:
-        print(">> Settings are valid")
-        
-    print("===============================================================")
-    print("Validating Site")
-    print("===============================================================")
-    missing_keys, _, invalid_keys = validate_dict(samplesheet.site, site_patterns).values()
-    if len(missing_keys) > 0:
-        raise Exception (f"Missing keys: {missing_keys}")
-    elif len(invalid_keys) > 0:
-        print (f"Valid Entry has a format of:")
-        print ('---------------------------------------------------------------')
-        for entry, value in site_patterns.items():
-            print (f"{entry}: {value}")
-            print ('---------------------------------------------------------------')
-        raise Exception (f"Invalid Entry: {invalid_keys}")
-    else:
-        print(">> Site is valid")
-
-    print("===============================================================")
-    print("Validating Data")
-    print("===============================================================")
-    missing_keys, _, invalid_keys = validate_dict(samplesheet_data, data_patterns).values()
-    if len(missing_keys) > 0:
-        raise Exception (f"Missing keys: {missing_keys}")
-    elif len(invalid_keys) > 0:
-        print (f"Valid Entry has a format of:")
-        print ('---------------------------------------------------------------')
-        for entry, value in data_patterns.items():
-            print (f"{entry}: {value}")
-            print ('---------------------------------------------------------------')
-        raise Exception (f"Invalid Entry: {invalid_keys}")
-    else:
-        print("> Data structure is valid")
-        print ("---------------------------------------------------------------")
-
-    ## validating D/R pair
-    drInvalidCounter = 0
-    sampleIDs = samplesheet_data['Sample_ID']
-    sampleIds = sampleIDs.tolist()
-    duplicateIds = sampleIDs[sampleIDs.duplicated()].tolist()
-    if len(duplicateIds) > 0:
-        print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-        print (f"Sample_ID is not unique: {duplicateIds}")
-        drInvalidCounter += 1
-        print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-    else:
-        print("> All samples are unique")
-        print ("---------------------------------------------------------------")
-
-    for sampleId in sampleIds:
-        sampleDomain = sampleId[:-2]
-        match sampleId[-2:]:
-            case "-D":
-                if sampleDomain+"-R" not in sampleIds:
-                    print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-                    print (f"RNA sample pair for DNA sample: {sampleId} is required")
-                    drInvalidCounter += 1
-                    print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-            case "-R":
-                if sampleDomain+'-D' not in sampleIds:
-                    print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-                    print (f"DNA sample pair for RNA sample: {sampleId} is required")
-                    drInvalidCounter += 1
-                    print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-            case _:
-                print ('---------------------------------------------------------------')
-                raise Exception (f"Sample format need to be either DNA or RNA")
-                print ('---------------------------------------------------------------')
-                
-    if drInvalidCounter == 0:
-        print("> All samples pair D/R checked")
-        print ("---------------------------------------------------------------")
-
-    ## validating index_ID, I7_index_ID and I5_index_ID order
-    drIndexOrderN = 0
-    if not is_series_ordered(samplesheet_data.Index_ID):
-        print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-        print (f"Index_ID is not ordered")
-        print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-        drIndexOrderN += 1
-    if not is_series_ordered(samplesheet_data['I7_Index_ID']):
-        print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-        print (f"I7_Index_ID is not ordered")
-        print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-        drIndexOrderN += 1
-    if not is_series_ordered(samplesheet_data['I5_Index_ID']):
-        print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-        print (f"I5_Index_ID is not ordered")
-        print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-        drIndexOrderN += 1
-
-    if drIndexOrderN == 0:
-        print ("> Index_ID, I7_Index_ID and I5_Index_ID are ordered")
-        print ("---------------------------------------------------------------")
-    
-    ## validating index and index2
-    main_path = os.path.dirname(os.path.abspath(__main__.__file__))
-    udp_rela_path = os.path.join(main_path, udp)
-    indexData = parser.parse_index_data(os.path.abspath(udp_rela_path))
-    drInvalidIndex = 0
-    
-    if not all(samplesheet_data['index'].isin(indexData['index'])):
-        print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-        print (f"index is not valid")
-        print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-        drInvalidIndex += 1
-    if not all(samplesheet_data['index2'].isin(indexData['index2'])):
-        print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-        print (f"index2 is not valid")
-        print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-        drInvalidIndex += 1
-                        
-    if drInvalidCounter == 0 and drInvalidIndex == 0 and drIndexOrderN == 0:
-        print ("---------------------------------------------------------------")
-        print ("> index and index2 are valid")
-        print ("---------------------------------------------------------------")
-    elif drInvalidCounter == 0 and drInvalidIndex == 0 and drIndexOrderN != 0 and mode == 'skip':
-        print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-        print (f"{drIndexOrderN} Index Order Exceptions found, Ignore Index order ...")
-        print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')       
-    else:
-        print ('+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-        raise Exception (f"A total of {drInvalidCounter+drInvalidIndex+drIndexOrderN} exceptions detected for D/R sample pairs, please refer to details above")
-    
-    
-    print (">> Data is valid")
-    print("===============================================================")
-    
-    print("===============================================================")
-    print("Validating BCLConvert Settings")
-    print("===============================================================")
-    missing_keys, _, invalid_keys = validate_dict(samplesheet.bclconvert_settings, bclconvert_settings_patterns).values()
-    if len(missing_keys) > 0:
-        raise Exception (f"Missing keys: {missing_keys}")
-    elif len(invalid_keys) > 0:
-        print (f"Valid Entry has a format of:")
-        print ('---------------------------------------------------------------')
-        for entry, value in bclconvert_settings_patterns.items():
-            print (f"{entry}: {value}")
-            print ('---------------------------------------------------------------')
-        raise Exception (f"Invalid Entry: {invalid_keys}")
-    else:
-        print(">> BCLConvert Settings are valid")
-        
-    print("===============================================================")
-    print("Validating BCLConvert Data")
-    print("===============================================================")
-    missing_keys, _, invalid_keys = validate_dict(bcl_data, bclconvert_data_patterns).values()
-    if len(missing_keys) > 0:
-        raise Exception (f"Missing keys: {missing_keys}")
-    elif len(invalid_keys) > 0:
-        print (f"Valid Entry has a format of:")
-        print ('---------------------------------------------------------------')
-        for entry, value in bclconvert_data_patterns.items():
-            print (f"{entry}: {value}")
-            print ('---------------------------------------------------------------')
-        raise Exception (f"Invalid Entry: {invalid_keys}")
-    else:
-        print(">> BCLConvert Data is valid")
-    
-    print("===============================================================")
-    print("===============================================================")
-    print(">> Samplesheet is valid")
-    print("===============================================================")
+def main(samplesheet:str, checker:Checker, profiler:Profiler=None, reporter:Reporter=None):
+    """
+    Validates a samplesheet stage by stage, running the stages of
+    `validation.STAGES` in order and stopping at the first one that finds
+    an error. Issues are reported as each stage ends; warnings do not
+    stop the check.
+
+    Raises:
+        InvalidSampleSheetError: naming the stage that failed
+    """
+    reporter = reporter or Reporter()
+
+    try:
+        samplesheet = checker.parse(samplesheet, profiler)
+    except ParseLimitError as e:
+        raise InvalidSampleSheetError("Parse", e.message)
+    kit = checker.kit(samplesheet)
+    context = checker.context(samplesheet, kit=kit)
+
+    for name in STAGES:
+        reporter.switch(name)
+        if name == "Index order" and len(checker.kits) > 1:
+            reporter.info(f"> Checking indexes against UDP kit {kit}")
+        with profiler.stage(name) if profiler is not None else nullcontext():
+            issues = run_stage(name, context)
+        errors = 0
+        for issue in issues:
+            if issue.severity == "error":
+                reporter.failure(issue.message)
+                errors += 1
+            else:
+                # e.g. reversed runs in skip mode
+                reporter.warning(issue.message)
+        if errors > 0:
+            if name in STAGE_PATTERNS:
+                report_patterns(reporter, STAGE_PATTERNS[name])
+            raise InvalidSampleSheetError(
+                name, f"{errors} {'error' if errors == 1 else 'errors'} found, please refer to details above")
+        reporter.info(f">> {name} is valid")
+
+    reporter.verdict(">> Samplesheet is valid", valid=True)
     
 
+def report_patterns(reporter: Reporter, patterns):
+    """
+    Reports the valid format of each field of a section, at verbose level
+    """
+    if reporter.enabled("detail"):
+        reporter.detail("Valid Entry has a format of:")
+        for entry, value in patterns.items():
+            reporter.detail(f"{entry}: {value}")
+
+# kept for compatibility: the checks themselves are run by `validation`
 # Function to validate a field against its pattern
 def validate_field(patterns, field, value):
-    pattern = patterns.get(field)
-    if pattern is not None:
-        return bool(re.match(pattern, value))
-    return True  # Return True for fields without a pattern
+    return compile_schema(patterns).check(field, value)
+
+def validate_dict(data, patterns, reporter: Reporter = None):
+    plan = compile_schema(patterns)
+    if reporter is not None and reporter.enabled("detail"):
+        for field, pattern in patterns.items():
+            reporter.detail(f"{field} {pattern}")
+
+    if isinstance(data, dict):
+        return plan.validate(data)
 
-def validate_dict(data, patterns):
     valid_keys = []
     invalid_keys = []
-    missing_keys = set(patterns.keys()) - set(data.keys())
-
-    for field, pattern in patterns.items():
-        print (field, pattern)
-        if field not in data:
-            missing_keys.add(field)
-        elif isinstance(pattern, str):
-            if isinstance(data[field], pd.Series):
-                for value in data[field]:
-                    if value == pattern:
-                        valid_keys.append(value)
-                    else:
-                        invalid_keys.append(value)
-            elif data[field] == pattern:
-                valid_keys.append(field)
-            else:    
-                invalid_keys.append(field)        
-                
-        elif isinstance(pattern, re.Pattern):
-            if isinstance(data[field], pd.Series):
-                for value in data[field]:
-                    if pattern.match(value):
-                        valid_keys.append(value)
-                    else:
-                        invalid_keys.append(value)
-            elif pattern.match(data[field]):
-                valid_keys.append(field)            
-            else:
-                invalid_keys.append(field)
-        else:
-            invalid_keys.append(field)
+    for field in patterns:
+        if field in data:
+            column = list(data[field])
+            failures = plan.column_failures(field, column)
+            valid_keys.extend(compress(column, [not failure for failure in failures]))
+            invalid_keys.extend(compress(column, failures))
 
     return {
-        "missing_keys": list(missing_keys),
+        "missing_keys": list(plan.required.difference(data.keys())),
         "valid_keys": valid_keys,
         "invalid_keys": invalid_keys
     }
 
-def is_series_ordered(series):
-    # Check if the Series is either equal to its sorted version or its reverse sorted version
-     return (series.equals(series.sort_values()) or series.equals(series.sort_values(ascending=False)))
+def find_samplesheets(pattern: str):
+    """
+    Expands a directory (all `*.csv` files in it) or a glob into a
+    sorted list of samplesheet paths
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.csv")
+    return sorted(glob.glob(pattern))
+
+def warm_up(udp: Union[str, List[str]], mode: str, cache: str = None):
+    """
+    Creates the checker of a batch worker process, so the UDP registry is
+    loaded and the schema compiled once per process. Workers given a
+    cache directory share its results.
+    """
+    global worker_checker
+    worker_checker = Checker(udp, mode, None if cache is None else ResultCache(cache_dir=cache))
+
+def check_samplesheet(samplesheet: str):
+    """
+    Validates one samplesheet with the worker's checker, returning the
+    result as a dict
+    """
+    try:
+        return worker_checker.check(samplesheet).to_dict()
+    except Exception as e:
+        # e.g. an unreadable file
+        result = ValidationResult(samplesheet)
+        result.issues.append(Issue("", "stage_error", f"{type(e).__name__}: {e}"))
+        return result.to_dict()
+
+def check_all(samplesheet: str, checker: Checker, output: str, profiler: Profiler = None,
+              reporter: Reporter = None):
+    """
+    Validates one samplesheet with every stage run to completion, reports
+    each issue and writes the result to `output/<samplesheet name>.json`
+    """
+    reporter = reporter or Reporter()
+    result = checker.check(samplesheet, profiler=profiler)
+    path = result.write(output)
+    reporter.result(result, f", report written to {path}")
+    return result
+
+def profile_memory(profiler: Profiler, samplesheet: str, checker: Checker):
+    """
+    Runs `main()` again in the profiler's traced pass, discarding its
+    output, to add the peak memory of each stage to the timings
+    """
+    with profiler.traced():
+        try:
+            main(samplesheet, checker, profiler, Reporter(NullSink()))
+        except InvalidSampleSheetError:
+            pass
+
+def report_profile(profiler: Profiler, samplesheet: str, output: str):
+    """
+    Prints the stage timings and writes the JSON trace, and the cProfile
+    statistics of the slowest stage if recorded, to `output`
+    """
+    profiler.close()
+    print ("===============================================================")
+    print (profiler.table())
+    os.makedirs(output, exist_ok=True)
+    name = os.path.splitext(os.path.basename(samplesheet))[0]
+    path = profiler.write_trace(os.path.join(output, f"{name}.trace.json"))
+    print (f">> Stage timings written to {path}")
+    path = os.path.join(output, f"{name}.prof")
+    stage = profiler.dump_hottest(path)
+    if stage is not None:
+        print (f">> cProfile statistics of the slowest stage ({stage}) written to {path}")
+
+def batch(pattern: str, udp: Union[str, List[str]], mode: str, output: str, jobs: int = None,
+          reporter: Reporter = None, cache: str = None):
+    """
+    Validates every samplesheet matching `pattern` on a process pool and
+    writes an aggregated report to `output/batch_report.json`
+
+    Returns:
+        the per-file results
+    """
+    reporter = reporter or Reporter()
+    samplesheets = find_samplesheets(pattern)
+    jobs = jobs or os.cpu_count() or 1
+    chunksize = max(1, len(samplesheets) // (jobs * 4))
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=warm_up, initargs=(udp, mode, cache)) as pool:
+        results = list(pool.map(check_samplesheet, samplesheets, chunksize=chunksize))
+
+    n_valid = sum(result["verdict"] == "valid" for result in results)
+    os.makedirs(output, exist_ok=True)
+    report_path = os.path.join(output, "batch_report.json")
+    with open(report_path, "w") as f:
+        json.dump({
+            "udp": udp,
+            "mode": mode,
+            "total": len(results),
+            "valid": n_valid,
+            "invalid": len(results) - n_valid,
+            "results": results
+        }, f, indent=2)
+
+    for result in results:
+        reporter.switch(result["samplesheet"])
+        for issue in result["issues"]:
+            if issue["severity"] == "error":
+                reporter.failure(f"{result['samplesheet']}: [{issue['section']}] {issue['message']}")
+    reporter.verdict(f">> {n_valid} of {len(results)} samplesheets are valid, report written to {report_path}",
+                     n_valid == len(results))
+
+    return results
+
+def watch_stages(checker: Checker):
+    """
+    Validation stages for watch mode, each with the sections it reads.
+    Stages re-run for the same check share one `SheetContext`.
+    """
+    current = {}
+
+    def context_for(samplesheet):
+        if current.get("samplesheet") is not samplesheet:
+            current["samplesheet"] = samplesheet
+            current["context"] = checker.context(samplesheet)
+        return current["context"]
+
+    return {
+        name: (sections, lambda samplesheet, name=name: run_stage(name, context_for(samplesheet)))
+        for name, (sections, _) in STAGES.items()
+    }
+
+def watch_reporter(reporter: Reporter):
+    """
+    Returns the callback reporting the verdict for a samplesheet checked
+    in watch mode
+    """
+    def report(path: str, results, rerun, seconds: float):
+        issues = merge_issues(results.values())
+        errors = [issue for issue in issues if issue.severity == "error"]
+        reporter.switch(path)
+        reporter.info(f"re-ran {', '.join(rerun) or 'nothing'} in {seconds * 1e3:.1f} ms")
+        for issue in issues:
+            message = f"{path}: [{issue.section}] {issue.message}"
+            if issue.severity == "error":
+                reporter.failure(message)
+            else:
+                reporter.warning(message)
+        reporter.verdict(f">> {path} is valid" if len(errors) == 0 else f">> {path}: {len(errors)} errors found",
+                         len(errors) == 0)
+    return report
+
+def watch(directory: str, checker: Checker, interval: float = 1.0, reporter: Reporter = None):
+    """
+    Watches a run folder, re-validating samplesheets as they change
+    """
+    reporter = reporter or Reporter()
+    print (f"Watching {directory} for *SampleSheet*.csv changes, press Ctrl+C to stop")
+    SampleSheetWatcher(directory, watch_stages(checker)).run(watch_reporter(reporter), interval)
 
 if __name__ == "__main__":
 
     args = parse_arguments()
-    main(args.samplesheet, args.udp, args.mode)
\ No newline at end of file
+    reporter = Reporter(SINKS[args.format](), min(args.verbose, VERBOSE))
+    if args.batch is not None:
+        results = batch(args.batch, args.udp, args.mode, args.output, args.jobs, reporter, args.cache)
+        sys.exit(0 if all(result["verdict"] == "valid" for result in results) else 1)
+    elif args.watch is not None:
+        watch(args.watch, Checker(args.udp, args.mode), args.interval, reporter)
+    else:
+        checker = Checker(args.udp, args.mode, None if args.cache is None else ResultCache(cache_dir=args.cache))
+        profiler = Profiler(memory=args.memory, cprofile=args.cprofile) if args.profile else None
+        try:
+            if args.all:
+                result = check_all(args.samplesheet, checker, args.output, profiler, reporter)
+            else:
+                try:
+                    main(args.samplesheet, checker, profiler, reporter)
+                except InvalidSampleSheetError as e:
+                    reporter.failure(f"{e.stage}: {e.message}")
+                    reporter.verdict(">> Samplesheet is invalid", valid=False)
+                    sys.exit(1)
+        finally:
+            # also reported when the check raised, to show where it stopped
+            if profiler is not None:
+                if profiler.memory and not args.all:
+                    profile_memory(profiler, args.samplesheet, checker)
+                report_profile(profiler, args.samplesheet, args.output)
+        if args.all:
+            sys.exit(0 if result.is_valid else 1)
\ No newline at end of file
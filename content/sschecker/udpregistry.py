@@ -0,0 +1,270 @@
+"""
+Lookup structures for UDP index registries (`TSO-novaseq-UDP_v1.5_chemistry.csv`)
+"""
+import hashlib
+import json
+import os
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from barcodes import reverse_complement
+from samplesheetparser import IndexSheet
+
+REGISTRY_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sschecker")
+
+IndexEntry = Tuple[str, str, str]
+
+# orientations of a sheet's index2 relative to the registry
+FORWARD = "forward"
+REVERSE_COMPLEMENT = "reverse_complement"
+
+_registries: Dict[str, "UdpRegistry"] = {}
+
+
+class UdpRegistry(object):
+    """
+    Hashed lookups over the entries of a UDP index registry file.
+
+    Registries are built once per file content: `UdpRegistry.load()`
+    hashes the file, and reuses a registry already loaded in this process
+    or cached on disk under the same hash before falling back to parsing
+    the file.
+
+    Basic usage:
+
+        >>> registry = UdpRegistry.load("TSO-novaseq-UDP_v1.5_chemistry.csv")
+        >>> registry.pair("UDP0001")
+        ('GAACTGAGCG', 'CGCTCCACGA')
+        >>> registry.index_id("GAACTGAGCG", "CGCTCCACGA")
+        'UDP0001'
+
+    Attributes:
+        digest: sha256 of the registry file contents
+        index_ids: Index_IDs in registry row order
+        ranks: dict of Index_ID to its position in registry row order
+        pairs: dict of Index_ID to (index, index2)
+        index_ids_by_pair: dict of (index, index2) to Index_ID
+        index_ids_by_rc_pair: dict of (index, reverse complement of
+            index2) to Index_ID, for sheets written for instruments that
+            read i5 in the other orientation
+    """
+    def __init__(self, entries: List[IndexEntry], digest: str = None) -> None:
+        """
+        Args:
+            entries: (Index_ID, index, index2) for each registry row, in order
+            digest: content hash of the file the entries were read from
+        """
+        self.digest = digest
+        self.index_ids = [index_id for index_id, _, _ in entries]
+        self.ranks = {index_id: rank for rank, index_id in enumerate(self.index_ids)}
+        self.pairs = {index_id: (index, index2) for index_id, index, index2 in entries}
+        self.index_ids_by_pair = {
+            (index, index2): index_id for index_id, index, index2 in entries
+        }
+        self.index_ids_by_rc_pair = {
+            (index, reverse_complement(index2)): index_id for index_id, index, index2 in entries
+        }
+
+    def __len__(self) -> int:
+        return len(self.index_ids)
+
+    def entries(self) -> List[IndexEntry]:
+        """
+        Returns (Index_ID, index, index2) for each entry, in row order
+        """
+        return [(index_id, *self.pairs[index_id]) for index_id in self.index_ids]
+
+    def pair(self, index_id: str) -> Optional[Tuple[str, str]]:
+        """
+        Returns the (index, index2) pair registered for an Index_ID
+        """
+        return self.pairs.get(index_id)
+
+    def index_id(self, index: str, index2: str) -> Optional[str]:
+        """
+        Returns the Index_ID registered for an (index, index2) pair
+        """
+        return self.index_ids_by_pair.get((index, index2))
+
+    def orientations(self, indexes: Sequence[str], index2s: Sequence[str]) -> List[Optional[str]]:
+        """
+        Returns the orientation in which each row's (index, index2) pair is
+        registered: `FORWARD`, `REVERSE_COMPLEMENT`, or None when it is
+        registered in both (a palindromic i5) or in neither
+        """
+        pairs = list(zip(indexes, index2s))
+        forward = map(self.index_ids_by_pair.__contains__, pairs)
+        reverse = map(self.index_ids_by_rc_pair.__contains__, pairs)
+        return [
+            None if is_forward == is_reverse else FORWARD if is_forward else REVERSE_COMPLEMENT
+            for is_forward, is_reverse in zip(forward, reverse)
+        ]
+
+    def check_row(self, index: str, index2: str, *index_ids: str) -> Optional[str]:
+        """
+        Checks that an (index, index2) pair is a registered pair, with
+        index2 in either orientation, and that every given ID (e.g.
+        Index_ID, I7_Index_ID, I5_Index_ID) names that same registry entry.
+
+        Returns:
+            None if the row is consistent, otherwise a description of
+            the problem
+        """
+        registered_id = self.index_ids_by_pair.get((index, index2))
+        if registered_id is None:
+            registered_id = self.index_ids_by_rc_pair.get((index, index2))
+        if registered_id is None:
+            return f"index/index2 pair {index}/{index2} is not a registered pair"
+        mismatched = [index_id for index_id in index_ids if index_id != registered_id]
+        if mismatched:
+            return (f"index/index2 pair {index}/{index2} is registered as {registered_id},"
+                    f" not {', '.join(mismatched)}")
+        return None
+
+    @classmethod
+    def from_file(cls, filename: str, digest: str = None) -> "UdpRegistry":
+        """
+        Builds a registry by parsing the *[Data]* section of a registry file
+        """
+        data = IndexSheet(filename, lazy=True, layout="columns").data
+        entries = list(zip(data["Index_ID"], data["index"], data["index2"]))
+        return cls(entries, digest)
+
+    @classmethod
+    def load(cls, filename: str, cache_dir: Optional[str] = CACHE_DIR) -> "UdpRegistry":
+        """
+        Returns the registry for a file, keyed by the hash of its contents.
+        Relative filenames are resolved against the working directory
+        first, then against the directory holding the bundled registry.
+
+        Args:
+            filename: path to registry file
+            cache_dir: directory for the on-disk cache; None disables it
+        """
+        filename = resolve_registry_path(filename)
+        with open(filename, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+
+        registry = _registries.get(digest)
+        if registry is not None:
+            return registry
+
+        cache_file = None
+        if cache_dir is not None:
+            cache_file = os.path.join(cache_dir, f"udp-{digest}.json")
+            try:
+                with open(cache_file) as f:
+                    registry = cls([tuple(entry) for entry in json.load(f)], digest)
+            except (OSError, ValueError):
+                registry = None
+
+        if registry is None:
+            registry = cls.from_file(filename, digest)
+            if cache_file is not None:
+                try:
+                    os.makedirs(cache_dir, exist_ok=True)
+                    with open(cache_file, "w") as f:
+                        json.dump(registry.entries(), f)
+                except OSError:
+                    # the cache is an optimisation only
+                    pass
+
+        _registries[digest] = registry
+        return registry
+
+
+class KitFit(NamedTuple):
+    """
+    How well the registries of a `KitRegistry` fit a sheet
+
+    Attributes:
+        kit: the kit registering most of the sheet's index pairs
+        matched: rows registered by `kit`, in either i5 orientation
+        total: rows in the sheet
+        scores: dict of kit to rows it registers, for every kit
+    """
+    kit: str
+    matched: int
+    total: int
+    scores: Dict[str, int]
+
+
+class KitRegistry(object):
+    """
+    Several UDP registries (kit versions, chemistries) merged into one
+    lookup, each index pair tagged with the kits that register it, so the
+    kit that fits a sheet is found in one pass over its index pairs.
+
+    Basic usage:
+
+        >>> kits = KitRegistry.load(["TSO-novaseq-UDP_v1.5_chemistry.csv", "TSO-UDP_v1.0.csv"])
+        >>> fit = kits.best_fit(data["index"], data["index2"])
+        >>> registry = kits.registries[fit.kit]
+
+    Attributes:
+        registries: dict of kit name to its `UdpRegistry`, in the order given
+        files: dict of kit name to registry file
+        kits_by_pair: dict of (index, index2) to the kits registering the
+            pair, with index2 in either orientation
+    """
+    def __init__(self, registries: Dict[str, UdpRegistry], files: Optional[Dict[str, str]] = None) -> None:
+        self.registries = registries
+        self.files = files or {}
+        kits_by_pair: Dict[Tuple[str, str], List[str]] = {}
+        for kit, registry in registries.items():
+            for pair in [*registry.index_ids_by_pair, *registry.index_ids_by_rc_pair]:
+                kits = kits_by_pair.setdefault(pair, [])
+                # a palindromic i5 registers the same pair in both orientations
+                if not kits or kits[-1] != kit:
+                    kits.append(kit)
+        self.kits_by_pair = {pair: tuple(kits) for pair, kits in kits_by_pair.items()}
+
+    def __len__(self) -> int:
+        return len(self.registries)
+
+    @property
+    def default(self) -> str:
+        """
+        The first kit, used when a sheet cannot tell kits apart
+        """
+        return next(iter(self.registries))
+
+    def best_fit(self, indexes: Sequence[str], index2s: Sequence[str]) -> KitFit:
+        """
+        Scores every kit by the number of the sheet's (index, index2) pairs
+        it registers and returns the best. Ties go to the kit given first.
+        """
+        scores = dict.fromkeys(self.registries, 0)
+        total = 0
+        for pair in zip(indexes, index2s):
+            total += 1
+            for kit in self.kits_by_pair.get(pair, ()):
+                scores[kit] += 1
+        kit = max(scores, key=scores.__getitem__)
+        return KitFit(kit, scores[kit], total, scores)
+
+    @classmethod
+    def load(cls, filenames: Sequence[str], cache_dir: Optional[str] = CACHE_DIR) -> "KitRegistry":
+        """
+        Loads each registry file with `UdpRegistry.load()`. Kits are named
+        after their file, without the extension.
+        """
+        registries = {}
+        files = {}
+        for filename in filenames:
+            kit = os.path.splitext(os.path.basename(filename))[0]
+            if kit in registries:
+                kit = filename
+            registries[kit] = UdpRegistry.load(filename, cache_dir)
+            files[kit] = filename
+        return cls(registries, files)
+
+
+def resolve_registry_path(filename: str) -> str:
+    """
+    Resolves a registry filename, falling back to the bundled registry
+    directory for relative names that do not exist in the working directory
+    """
+    if os.path.isabs(filename) or os.path.exists(filename):
+        return os.path.abspath(filename)
+    return os.path.join(REGISTRY_DIR, filename)
@@ -0,0 +1,475 @@
+"""
+Collect-all validation of TSO500 samplesheets
+
+Every validation stage runs to completion and reports its problems as
+`Issue`s, so one call returns everything that is wrong with a sheet.
+
+Basic usage:
+
+    >>> from validation import validate
+    >>> result = validate("SampleSheet.csv")
+    >>> result.is_valid
+    >>> result.write("report")
+
+Only the standard library is needed: tabular sections are checked as the
+parser's column lists, and numpy is imported by the collision check only
+for large pools.
+"""
+from contextlib import nullcontext
+from itertools import compress
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from barcodes import find_index_collisions
+from ordering import check_order
+from pairing import check_pairs
+from profiling import Profiler
+from results import Issue, ValidationResult
+from samplesheetparser import SampleSheet, Table
+from schema import header_patterns, reads_patterns, settings_patterns, site_patterns, bclconvert_settings_patterns
+from schema import data_patterns, bclconvert_data_patterns
+from schemaplan import compile_schema
+from udpregistry import FORWARD, REVERSE_COMPLEMENT, UdpRegistry
+
+DEFAULT_UDP = "TSO-novaseq-UDP_v1.5_chemistry.csv"
+
+
+class SheetContext(object):
+    """
+    A samplesheet and check options shared by the validation stages
+
+    Attributes:
+        samplesheet: columnar `SampleSheet`, parsed lazily, streamed or
+            eagerly
+        udp: UDP registry file
+        mode: sample index selection mode (`default` or `skip`)
+        registry: the loaded `udp` registry; loaded on first use unless given
+    """
+    def __init__(self,
+                 samplesheet: SampleSheet,
+                 udp: str = DEFAULT_UDP,
+                 mode: str = "default",
+                 registry: Optional[UdpRegistry] = None) -> None:
+        if samplesheet.layout != "columns":
+            # the stages read tabular sections as columns
+            raise ValueError(f'Validation requires a samplesheet parsed with layout="columns",'
+                             f' not "{samplesheet.layout}"')
+        self.samplesheet = samplesheet
+        self.udp = udp
+        self.mode = mode
+        self._registry = registry
+
+    @property
+    def registry(self) -> UdpRegistry:
+        if self._registry is None:
+            self._registry = UdpRegistry.load(self.udp)
+        return self._registry
+
+
+def validate_table(data: Table, patterns):
+    """
+    Validates a tabular section column by column. Returns the missing
+    columns, a failure mask per column, and a (row, column, value) entry
+    for every failing cell so reports can point at exact positions.
+    `data` is a columnar `Table`, or a DataFrame with a default index.
+    """
+    plan = compile_schema(patterns)
+    missing_keys = [field for field in patterns if field not in data]
+    failure_masks = {}
+    invalid_entries = []
+
+    for field in patterns:
+        if field in data:
+            column = list(data[field])
+            failures = plan.column_failures(field, column)
+            failure_masks[field] = failures
+            for row in compress(range(len(column)), failures):
+                invalid_entries.append((row, field, column[row]))
+
+    return {
+        "missing_keys": missing_keys,
+        "failure_masks": failure_masks,
+        "invalid_entries": invalid_entries
+    }
+
+
+def _describe(pattern) -> str:
+    """
+    Returns a schema pattern as shown in messages
+    """
+    return getattr(pattern, "pattern", pattern)
+
+
+def record_issues(section: str, record: dict, patterns) -> List[Issue]:
+    """
+    Validates a record section against its schema patterns
+    """
+    missing_keys, _, invalid_keys = compile_schema(patterns).validate(record).values()
+    issues = [
+        Issue(section, "missing_key", f"Missing key: {field}", field=field)
+        for field in patterns if field in missing_keys
+    ]
+    issues += [
+        Issue(section, "pattern", f"Invalid entry: {field} should match {_describe(patterns[field])}",
+              field=field, value=record[field])
+        for field in invalid_keys
+    ]
+    return issues
+
+
+def table_issues(section: str, data: Table, patterns) -> List[Issue]:
+    """
+    Validates a tabular section against its schema patterns
+    """
+    missing_keys, _, invalid_entries = validate_table(data, patterns).values()
+    issues = [
+        Issue(section, "missing_key", f"Missing column: {field}", field=field)
+        for field in missing_keys
+    ]
+    issues += [
+        Issue(section, "pattern", f"Row {row}, {field}: {value} should match {_describe(patterns[field])}",
+              field=field, row=row, value=value)
+        for row, field, value in invalid_entries
+    ]
+    return issues
+
+
+def pairing_issues(data: Table) -> List[Issue]:
+    """
+    Checks D/R sample pairing, Pair_ID and Sample_Type
+    """
+    pairing = check_pairs(list(data['Sample_ID']),
+                          list(data['Pair_ID']) if 'Pair_ID' in data else None,
+                          list(data['Sample_Type']) if 'Sample_Type' in data else None)
+    section = "TSO500S_Data"
+    issues = [
+        Issue(section, "unique_sample", f"Sample_ID is not unique: {sample_id}",
+              field="Sample_ID", row=row, value=sample_id)
+        for row, sample_id in pairing.duplicates
+    ]
+    issues += [
+        Issue(section, "sample_format", f"Sample format need to be either DNA or RNA: {sample_id}",
+              field="Sample_ID", row=row, value=sample_id)
+        for row, sample_id in pairing.malformed
+    ]
+    issues += [
+        Issue(section, "dr_pair", f"Sample pair {partner_id} for sample: {sample_id} is required",
+              field="Sample_ID", row=row, value=sample_id)
+        for row, sample_id, partner_id in pairing.unpaired
+    ]
+    issues += [
+        Issue(section, "pair_consistency", f"{sample_id}: {reason}",
+              field=reason.split(" ", 1)[0], row=row, value=sample_id)
+        for row, sample_id, reason in pairing.mismatched
+    ]
+    return issues
+
+
+def order_issues(data: Table, registry: UdpRegistry, mode: str = "default") -> List[Issue]:
+    """
+    Checks that Index_ID, I7_Index_ID and I5_Index_ID follow the registry
+    order, either way round, reporting the first break of each column.
+    In `skip` mode reversed runs are only a warning; other misordering is
+    still an error. IDs missing from the registry are reported by the UDP
+    registry stage and skipped here.
+    """
+    section = "TSO500S_Data"
+    issues = []
+    for column in ('Index_ID', 'I7_Index_ID', 'I5_Index_ID'):
+        if column not in data:
+            continue
+        report = check_order(data[column], registry.ranks)
+        misordered = report.misordered
+        reversed_runs = [order_break for order_break in report.breaks if order_break.reversed_run]
+        if misordered:
+            first = misordered[0]
+            more = f" ({len(misordered) - 1} more breaks)" if len(misordered) > 1 else ""
+            issues.append(Issue(section, "index_order",
+                                f"{column} is not ordered: row {first.row} ({first.value}) follows"
+                                f" {first.previous}{more}",
+                                field=column, row=first.row, value=first.value))
+        if reversed_runs:
+            first = reversed_runs[0]
+            more = f" ({len(reversed_runs) - 1} more reversed runs)" if len(reversed_runs) > 1 else ""
+            issues.append(Issue(section, "index_order_reversed",
+                                f"{column} runs in reverse order from row {first.row} ({first.value}) to"
+                                f" row {first.end}{more}",
+                                field=column, row=first.row, value=first.value,
+                                severity="warning" if mode == "skip" else "error"))
+    return issues
+
+
+def registry_issues(data: Table, registry: UdpRegistry) -> List[Issue]:
+    """
+    Checks each row's index/index2 pair and index IDs against the UDP registry
+    """
+    issues = []
+    rows = zip(data['Sample_ID'], data['index'], data['index2'],
+               data['Index_ID'], data['I7_Index_ID'], data['I5_Index_ID'])
+    for row, (sample_id, index, index2, *index_ids) in enumerate(rows):
+        problem = registry.check_row(index, index2, *index_ids)
+        if problem is not None:
+            issues.append(Issue("TSO500S_Data", "udp_registry", f"{sample_id}: {problem}",
+                                field="index", row=row, value=f"{index}/{index2}"))
+    return issues
+
+
+def orientation_issues(data: Table, registry: UdpRegistry) -> List[Issue]:
+    """
+    Works out whether the sheet's index2 column is in the registry's
+    orientation or its reverse complement. A sheet written entirely in
+    reverse complement gets a warning naming the orientation; in a sheet
+    mixing both, rows in the less common orientation are errors. Rows
+    whose pair is registered in neither orientation are reported by the
+    UDP registry stage.
+    """
+    section = "TSO500S_Data"
+    orientations = registry.orientations(data['index'], data['index2'])
+    n_forward = orientations.count(FORWARD)
+    n_reverse = orientations.count(REVERSE_COMPLEMENT)
+    if n_forward == 0 and n_reverse == 0:
+        return []
+    sheet_orientation = FORWARD if n_forward >= n_reverse else REVERSE_COMPLEMENT
+    if n_forward == 0 or n_reverse == 0:
+        if sheet_orientation == FORWARD:
+            return []
+        return [Issue(section, "index2_orientation",
+                      f"index2 is in reverse complement orientation relative to the UDP registry"
+                      f" ({n_reverse} rows); check that the instrument reads i5 in that orientation",
+                      field="index2", value=sheet_orientation, severity="warning")]
+
+    sample_ids = data['Sample_ID']
+    index2s = data['index2']
+    minority = REVERSE_COMPLEMENT if sheet_orientation == FORWARD else FORWARD
+    return [
+        Issue(section, "index2_orientation",
+              f"{sample_ids[row]}: index2 {index2s[row]} is in {minority.replace('_', ' ')} orientation,"
+              f" mixed with {max(n_forward, n_reverse)} rows in {sheet_orientation.replace('_', ' ')}"
+              f" orientation",
+              field="index2", row=row, value=index2s[row])
+        for row, orientation in enumerate(orientations) if orientation == minority
+    ]
+
+
+def collision_issues(data: Table, bcl_settings: dict) -> List[Issue]:
+    """
+    Checks the sheet's barcodes for collisions at the BCL Convert barcode
+    mismatch settings
+    """
+    section = "TSO500S_Data"
+    try:
+        collisions = find_index_collisions(
+            list(data['index']), list(data['index2']),
+            mismatches_index1=int(bcl_settings.get('BarcodeMismatchesIndex1', 1)),
+            mismatches_index2=int(bcl_settings.get('BarcodeMismatchesIndex2', 1)),
+            lanes=list(data['Lane']) if 'Lane' in data else None)
+    except ValueError as e:
+        return [Issue(section, "index_collision", f"index collisions could not be checked: {e}")]
+
+    sample_ids = list(data['Sample_ID'])
+    return [
+        Issue(section, "index_collision",
+              f"index collision between {sample_ids[collision.first]} and {sample_ids[collision.second]}:"
+              f" i7 distance {collision.i7_distance}, i5 distance {collision.i5_distance}",
+              field="index", row=collision.first, value=sample_ids[collision.second])
+        for collision in collisions
+    ]
+
+
+def join_issues(data: Table, bcl_data: Table) -> List[Issue]:
+    """
+    Joins *[BCLConvert_Data]* to *[TSO500S_Data]* on Sample_ID (and Lane,
+    when both sections have one) through a hash index of TSO500S_Data,
+    reporting BCLConvert_Data rows whose index/index2 differ, samples
+    missing from BCLConvert_Data and BCLConvert_Data rows for samples not
+    in TSO500S_Data. Sections without the joined columns are skipped;
+    their missing columns are reported by the Data stages.
+    """
+    key_columns = ['Lane', 'Sample_ID'] if 'Lane' in data and 'Lane' in bcl_data else ['Sample_ID']
+    if not all(column in table for table in (data, bcl_data) for column in key_columns + ['index', 'index2']):
+        return []
+
+    def label(key):
+        return key[-1] if len(key) == 1 else f"{key[1]} (lane {key[0]})"
+
+    # key -> (row, index, index2); repeated samples are reported by D/R pairing
+    samples = {}
+    keys = zip(*(data[column] for column in key_columns))
+    for row, (key, index, index2) in enumerate(zip(keys, data['index'], data['index2'])):
+        samples.setdefault(key, (row, index, index2))
+
+    issues = []
+    unmatched = dict(samples)
+    bcl_keys = zip(*(bcl_data[column] for column in key_columns))
+    for row, (key, index, index2) in enumerate(zip(bcl_keys, bcl_data['index'], bcl_data['index2'])):
+        sample = samples.get(key)
+        if sample is None:
+            issues.append(Issue("BCLConvert_Data", "extra_sample", f"{label(key)} is not in TSO500S_Data",
+                                field="Sample_ID", row=row, value=key[-1]))
+        elif unmatched.pop(key, None) is None:
+            issues.append(Issue("BCLConvert_Data", "extra_sample",
+                                f"{label(key)} is listed more than once in BCLConvert_Data",
+                                field="Sample_ID", row=row, value=key[-1]))
+        elif (index, index2) != sample[1:]:
+            issues.append(Issue("BCLConvert_Data", "barcode_mismatch",
+                                f"{label(key)}: index/index2 {index}/{index2} do not match"
+                                f" {sample[1]}/{sample[2]} in TSO500S_Data",
+                                field="index", row=row, value=f"{index}/{index2}"))
+
+    issues += [
+        Issue("TSO500S_Data", "missing_sample", f"{label(key)} is missing from BCLConvert_Data",
+              field="Sample_ID", row=row, value=key[-1])
+        for key, (row, _, _) in unmatched.items()
+    ]
+    return issues
+
+
+def duplicate_issues(samplesheet: SampleSheet, section: str) -> List[Issue]:
+    """
+    Reports the keys, column names and `[Section]` header repeated in a
+    section, as recorded when the section was parsed
+    """
+    names = {"key": "{name}", "column": "column {name}", "section": "[{name}]"}
+    return [
+        Issue(section, f"duplicate_{duplicate.kind}",
+              f"{names[duplicate.kind].format(name=duplicate.name)} is repeated on line {duplicate.line}"
+              f" (first on line {duplicate.first_line})",
+              field=None if duplicate.kind == "section" else duplicate.name, value=duplicate.name)
+        for duplicate in samplesheet.duplicates if duplicate.section == section
+    ]
+
+
+def _with_duplicates(section: str, check: Callable[[SheetContext], List[Issue]]):
+    """
+    Wraps the stage validating a section so it also reports the names
+    repeated in it; the section is parsed by `check`, which records them
+    """
+    def stage(context: SheetContext) -> List[Issue]:
+        issues = check(context)
+        return issues + duplicate_issues(context.samplesheet, section)
+    return stage
+
+
+def _requires(columns: Sequence[str], check: Callable[[SheetContext], List[Issue]]):
+    """
+    Wraps a Data stage so it only runs when the columns it reads exist;
+    missing columns are already reported by the Data stage
+    """
+    def stage(context: SheetContext) -> List[Issue]:
+        data = context.samplesheet.data
+        if not all(column in data for column in columns):
+            return []
+        return check(context)
+    return stage
+
+
+# stage name -> (sections read by the stage, stage)
+STAGES: Dict[str, Tuple[Tuple[str, ...], Callable[[SheetContext], List[Issue]]]] = {
+    "Header": (("Header",), _with_duplicates("Header", lambda context: record_issues(
+        "Header", context.samplesheet.header, header_patterns))),
+    "Reads": (("Reads",), _with_duplicates("Reads", lambda context: record_issues(
+        "Reads", context.samplesheet.reads, reads_patterns))),
+    "Settings": (("TSO500S_Settings",), _with_duplicates("TSO500S_Settings", lambda context: record_issues(
+        "TSO500S_Settings", context.samplesheet.settings, settings_patterns))),
+    "Site": (("NSWHP",), _with_duplicates("NSWHP", lambda context: record_issues(
+        "NSWHP", context.samplesheet.site, site_patterns))),
+    "Data": (("TSO500S_Data",), _with_duplicates("TSO500S_Data", lambda context: table_issues(
+        "TSO500S_Data", context.samplesheet.data, data_patterns))),
+    "D/R pairing": (("TSO500S_Data",), _requires(("Sample_ID",), lambda context: pairing_issues(
+        context.samplesheet.data))),
+    "Index order": (("TSO500S_Data",), lambda context: order_issues(
+        context.samplesheet.data, context.registry, context.mode)),
+    "UDP registry": (("TSO500S_Data",), _requires(
+        ("Sample_ID", "index", "index2", "Index_ID", "I7_Index_ID", "I5_Index_ID"),
+        lambda context: registry_issues(context.samplesheet.data, context.registry))),
+    "Index orientation": (("TSO500S_Data",), _requires(
+        ("Sample_ID", "index", "index2"),
+        lambda context: orientation_issues(context.samplesheet.data, context.registry))),
+    "Index collisions": (("TSO500S_Data", "BCLConvert_Settings"), _requires(
+        ("Sample_ID", "index", "index2"),
+        lambda context: collision_issues(context.samplesheet.data, context.samplesheet.bclconvert_settings))),
+    "BCLConvert Settings": (("BCLConvert_Settings",), _with_duplicates(
+        "BCLConvert_Settings", lambda context: record_issues(
+            "BCLConvert_Settings", context.samplesheet.bclconvert_settings, bclconvert_settings_patterns))),
+    "BCLConvert Data": (("BCLConvert_Data",), _with_duplicates(
+        "BCLConvert_Data", lambda context: table_issues(
+            "BCLConvert_Data", context.samplesheet.bclconvert_data, bclconvert_data_patterns))),
+    "Section join": (("TSO500S_Data", "BCLConvert_Data"), lambda context: join_issues(
+        context.samplesheet.data, context.samplesheet.bclconvert_data)),
+}
+
+
+def run_stage(name: str, context: SheetContext) -> List[Issue]:
+    """
+    Runs one validation stage. Missing sections and unexpected errors are
+    reported as issues rather than raised.
+    """
+    sections, stage = STAGES[name]
+    # eagerly parsed sheets do not index their sections, only parse them
+    present = context.samplesheet.sections
+    if present is None:
+        present = context.samplesheet.json
+    missing = [section for section in sections if section not in present]
+    if missing:
+        return [Issue(section, "missing_section", f"Missing section: [{section}]") for section in missing]
+    try:
+        return stage(context)
+    except Exception as e:
+        return [Issue(sections[0], "stage_error", f"{name} could not be checked: {type(e).__name__}: {e}")]
+
+
+def validate(samplesheet: str, udp: str = DEFAULT_UDP, mode: str = "default") -> ValidationResult:
+    """
+    Validates a samplesheet, running every stage to completion
+
+    Args:
+        samplesheet: path to samplesheet file
+        udp: UDP registry file
+        mode: sample index selection mode; in `skip` mode reversed runs
+            in the index order are reported as warnings
+
+    Returns:
+        a `ValidationResult` listing every issue found
+    """
+    context = SheetContext(SampleSheet(samplesheet, lazy=True, layout="columns"), udp, mode)
+    return run_stages(context, samplesheet)
+
+
+def run_stages(context: SheetContext, name: str, profiler: Optional[Profiler] = None) -> ValidationResult:
+    """
+    Runs every validation stage on a prepared `SheetContext`
+
+    Args:
+        context: samplesheet and check options
+        name: samplesheet name reported in the result
+        profiler: records the resources used by each stage, when given
+
+    Returns:
+        a `ValidationResult` listing every issue found
+    """
+    result = ValidationResult(name)
+    stage_issues = []
+
+    for stage in STAGES:
+        with profiler.stage(stage) if profiler is not None else nullcontext():
+            stage_issues.append(run_stage(stage, context))
+        result.stages.append(stage)
+
+    result.issues = merge_issues(stage_issues)
+    return result
+
+
+def merge_issues(stage_issues: Iterable[List[Issue]]) -> List[Issue]:
+    """
+    Flattens the issues of several stages, in stage order. A missing
+    section is reported once, not by every stage reading it.
+    """
+    issues = []
+    reported_sections = set()
+    for stage in stage_issues:
+        for issue in stage:
+            if issue.rule == "missing_section":
+                if issue.section in reported_sections:
+                    continue
+                reported_sections.add(issue.section)
+            issues.append(issue)
+    return issues
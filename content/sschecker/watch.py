@@ -0,0 +1,132 @@
+"""
+Watching a run folder for samplesheet changes
+"""
+import fnmatch
+import hashlib
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from samplesheetparser import SampleSheet
+
+# a stage re-runs when any of the sections it depends on changes. It is
+# called with the (lazily parsed) samplesheet and returns the problems found
+Stage = Tuple[Sequence[str], Callable[[SampleSheet], List[Any]]]
+
+
+class SampleSheetWatcher(object):
+    """
+    Polls a directory for new or modified samplesheets and re-validates
+    them incrementally. Each section's bytes are hashed, and only the
+    stages depending on a section whose hash changed since the last check
+    are re-run; results of the other stages are reused.
+
+    Basic usage:
+
+        >>> watcher = SampleSheetWatcher("run_folder", stages)
+        >>> watcher.run(print_result)
+
+    Attributes:
+        directory: directory being watched
+        pattern: filename pattern of the samplesheets to watch
+        stages: dict of stage name to (section names, validator)
+    """
+    def __init__(self,
+                 directory: str,
+                 stages: Dict[str, Stage],
+                 pattern: str = "*SampleSheet*.csv") -> None:
+        self.directory = directory
+        self.stages = stages
+        self.pattern = pattern
+        self._stats: Dict[str, Tuple[int, int]] = {}
+        self._digests: Dict[str, Dict[str, Tuple[Optional[str], ...]]] = {}
+        self._results: Dict[str, Dict[str, List[Any]]] = {}
+
+    def scan(self) -> List[str]:
+        """
+        Returns the samplesheets that are new or modified since the last
+        scan, judged by modification time and size
+        """
+        changed = []
+        seen = set()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file() or not fnmatch.fnmatch(entry.name, self.pattern):
+                    continue
+                stat = entry.stat()
+                key = (stat.st_mtime_ns, stat.st_size)
+                seen.add(entry.path)
+                if self._stats.get(entry.path) != key:
+                    self._stats[entry.path] = key
+                    changed.append(entry.path)
+
+        for path in set(self._stats) - seen:
+            self.forget(path)
+        return sorted(changed)
+
+    def forget(self, path: str) -> None:
+        """
+        Drops everything remembered about a samplesheet
+        """
+        self._stats.pop(path, None)
+        self._digests.pop(path, None)
+        self._results.pop(path, None)
+
+    def section_digests(self, samplesheet: SampleSheet) -> Dict[str, str]:
+        """
+        Hashes the bytes of each section of a lazily indexed samplesheet
+        """
+        with open(samplesheet.filename, "rb") as f:
+            data = f.read()
+        return {
+            name: hashlib.sha256(data[span.offset:span.offset + span.length]).hexdigest()
+            for name, span in samplesheet.sections.items()
+        }
+
+    def check(self, path: str) -> Tuple[Dict[str, List[Any]], List[str]]:
+        """
+        Re-validates a samplesheet, re-running only the stages whose
+        sections changed
+
+        Returns:
+            the problems found by every stage, and the names of the stages
+            that were re-run
+        """
+        samplesheet = SampleSheet(path, lazy=True, layout="columns")
+        digests = self.section_digests(samplesheet)
+        previous_digests = self._digests.setdefault(path, {})
+        results = self._results.setdefault(path, {})
+
+        rerun = []
+        for name, (sections, validator) in self.stages.items():
+            stage_digests = tuple(digests.get(section) for section in sections)
+            if name in results and previous_digests.get(name) == stage_digests:
+                continue
+            results[name] = validator(samplesheet)
+            previous_digests[name] = stage_digests
+            rerun.append(name)
+
+        return results, rerun
+
+    def run(self,
+            callback: Callable[[str, Dict[str, List[Any]], List[str], float], None],
+            interval: float = 1.0) -> None:
+        """
+        Polls the directory every `interval` seconds until interrupted,
+        calling `callback(path, results, rerun_stages, seconds)` for each
+        samplesheet that was checked
+        """
+        try:
+            while True:
+                for path in self.scan():
+                    start = time.perf_counter()
+                    try:
+                        results, rerun = self.check(path)
+                    except OSError:
+                        # removed or still being written; picked up next scan
+                        self._stats.pop(path, None)
+                        continue
+                    callback(path, results, rerun, time.perf_counter() - start)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass